@@ -3,6 +3,12 @@ from flaskext.sqlalchemy import SQLAlchemy
 
 SECRET_KEY = 'devkey'
 DEBUG = True
+BUILDS_PER_PAGE = 20
+BCRYPT_LOG_ROUNDS = 12
+HASH_WORKERS = 2
+HASH_QUEUE_LIMIT = 16
+CATALOGUE_MAX_AGE = 3600
+BUILD_PAGE_CACHE_BYTES = 16 * 1024 * 1024
 app = flask.Flask(__name__)
 app.config.from_object(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///trie_build_orders.db'
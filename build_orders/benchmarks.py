@@ -0,0 +1,89 @@
+import time, itertools
+import sc_units, sc_orders, sc_timeline
+
+def timed(f, *args, **kwargs):
+    start = time.time()
+    f(*args, **kwargs)
+    return time.time() - start
+
+def zerg_order_units(length):
+    cycle = itertools.cycle([sc_units.drone, sc_units.drone,
+        sc_units.overlord, sc_units.drone, sc_units.hatchery,
+        sc_units.drone, sc_units.evolution_chamber])
+    base = sc_orders.zerg_base._unit_order
+    return base + list(itertools.islice(cycle, length - len(base)))
+
+def build_page(units):
+    order = sc_orders.ZERG(*units)
+    order.distinguishing_features()
+    return order.supply
+
+def bench_build_page(lengths = (250, 500, 1000, 2000, 4000)):
+    print 'build page (replay + distinguishing features)'
+    for length in lengths:
+        elapsed = timed(build_page, zerg_order_units(length))
+        print '%6d steps: %8.2f ms  %6.2f us/step' % (length,
+                elapsed * 1000, elapsed * 1e6 / length)
+
+def zerg_timeline_units():
+    return sc_orders.zerg_base._unit_order + [sc_units.drone,
+        sc_units.overlord, sc_units.drone, sc_units.drone,
+        sc_units.spawning_pool, sc_units.drone, sc_units.extractor,
+        sc_units.drone, sc_units.zergling, sc_units.zergling]
+
+def zerg_roach_units():
+    return zerg_timeline_units() + [sc_units.queen, sc_units.overlord,
+        sc_units.drone, sc_units.drone, sc_units.hatchery, sc_units.drone,
+        sc_units.roach_warren, sc_units.overlord, sc_units.drone,
+        sc_units.lair, sc_units.roach, sc_units.roach, sc_units.overlord,
+        sc_units.roach, sc_units.roach]
+
+def simulate_all(units, count):
+    # Timelines are dropped as they go so the collector is not timed too.
+    for _ in xrange(count):
+        sc_timeline.simulate(sc_units.Races.ZERG, units)
+
+def bench_timeline(count = 2000, runs = 3):
+    print 'timeline simulation (best of %d)' % runs
+    for units in zerg_timeline_units(), zerg_roach_units():
+        elapsed = min(timed(simulate_all, units, count)
+                for _ in xrange(runs))
+        print '%3d steps: %6d builds %8.2f ms  %8.0f builds/s' % (
+                len(units) - len(sc_orders.zerg_base._unit_order), count,
+                elapsed * 1000, count / elapsed)
+
+tech_tree_units = {
+    sc_units.Races.ZERG: [sc_units.overlord, sc_units.spawning_pool,
+        sc_units.extractor, sc_units.drone, sc_units.lair],
+    sc_units.Races.PROTOSS: [sc_units.pylon, sc_units.gateway,
+        sc_units.assimilator, sc_units.cybernetics_core],
+    sc_units.Races.TERRAN: [sc_units.supply_depot, sc_units.barracks,
+        sc_units.refinery, sc_units.factory],
+}
+
+def tech_tree_panels(orders, cached):
+    for order in orders:
+        if not cached:
+            sc_orders.tech_trees.clear()
+        order.available_tech_tree
+
+def bench_tech_tree(count = 1000):
+    print 'tech tree panel (one tree per step)'
+    for race, units in sorted(tech_tree_units.iteritems()):
+        orders = [sc_orders.race_builds[race].copy()]
+        for unit in units:
+            orders.append(orders[-1].copy().add_unit(unit))
+        orders = orders * (count // len(orders))
+        # The same few orders repeat, so cached runs are nearly all hits;
+        # uncached runs build every tree.
+        for cached in True, False:
+            sc_orders.tech_trees.clear()
+            elapsed = timed(tech_tree_panels, orders, cached)
+            print '%8s: %6d trees %-8s %8.2f ms  %6.2f us/tree' % (race,
+                    len(orders), cached and 'cached' or 'uncached',
+                    elapsed * 1000, elapsed * 1e6 / len(orders))
+
+if __name__ == '__main__':
+    bench_build_page()
+    bench_timeline()
+    bench_tech_tree()
@@ -0,0 +1,60 @@
+import collections, threading, time
+
+class LRUCache(object):
+    def __init__(self, max_entries = 1024, ttl = None, max_size = None,
+            sizeof = len):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and not self._expired(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, entry):
+        return entry[1] is not None and entry[1] <= time.time()
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+        return entry
+
+    def get(self, key, default = None):
+        with self._lock:
+            entry = self._pop(key)
+            if entry is None or self._expired(entry):
+                return default
+            self._entries[key] = entry
+            self.size += entry[2]
+            return entry[0]
+
+    def set(self, key, value):
+        expires = self.ttl and time.time() + self.ttl
+        size = self.max_size is not None and self.sizeof(value) or 0
+        with self._lock:
+            self._pop(key)
+            if self.max_size is not None and size > self.max_size:
+                return value
+            self._entries[key] = value, expires, size
+            self.size += size
+            while len(self._entries) > self.max_entries or\
+                    (self.max_size is not None and self.size > self.max_size):
+                self.size -= self._entries.popitem(last = False)[1][2]
+            return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
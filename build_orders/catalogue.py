@@ -0,0 +1,19 @@
+import json, hashlib, collections
+import sc_units, func_utils
+
+Encoded = collections.namedtuple('Encoded', 'body etag')
+
+def encode(obj):
+    body = json.dumps(obj, separators = (',', ':'), sort_keys = True)
+    return Encoded(body, hashlib.sha1(body).hexdigest())
+
+def unit_data(unit):
+    return func_utils.map_sub(str, unit.data_obj)
+
+unit_options = dict((str(unit), encode(unit_data(unit)))
+        for unit in sc_units.gameunits_by_id)
+
+race_units = dict((race, encode({ 'units': map(unit_data, units) }))
+        for race, units in sc_units.race_units.iteritems())
+race_units[None] = encode({ 'units': map(unit_data,
+    sc_units.gameunits_by_id) })
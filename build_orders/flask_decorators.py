@@ -1,4 +1,4 @@
-import flask, functools
+import flask, functools, sqlalchemy
 from build_orders import app, models
 
 def logged_in():
@@ -17,17 +17,40 @@ def permission_required(*permissions):
         @functools.wraps(f)
         def decorated_function(*args, **kwargs):
             for permission in permissions:
-                if permission not in flask.g.user.permissions_list:
+                if permission not in flask.g.user.permissions:
                     flask.abort(403)
             return f(*args, **kwargs)
         return decorated_function
     return wrapped_view
 
+def count_query(*args):
+    if flask.has_request_context():
+        flask.g.query_count = getattr(flask.g, 'query_count', 0) + 1
+
+sqlalchemy.event.listen(sqlalchemy.engine.Engine, 'before_cursor_execute',
+        count_query)
+
+def max_queries(limit):
+    def wrapped_view(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not app.debug:
+                return f(*args, **kwargs)
+            start = getattr(flask.g, 'query_count', 0)
+            response = f(*args, **kwargs)
+            count = getattr(flask.g, 'query_count', 0) - start
+            if count > limit:
+                raise Exception('%s ran %d queries, expected at most %d' %
+                        (f.__name__, count, limit))
+            return response
+        return decorated_function
+    return wrapped_view
+
 @app.before_request
 def before_request():
     if models.User.SESSION_KEY in flask.session:
-        flask.g.user = models.User.query.filter_by(\
-                username = flask.session[models.User.SESSION_KEY]).first()
+        flask.g.user = models.User.identity_of(
+                flask.session[models.User.SESSION_KEY])
 
 @app.after_request
 def after_request(response):
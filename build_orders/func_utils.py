@@ -1,4 +1,4 @@
-import collections
+import collections, functools
 
 def is_iterable(o):
     return isinstance(o, collections.Sequence) and not isinstance(o, basestring)
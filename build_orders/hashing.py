@@ -0,0 +1,93 @@
+import threading, time, Queue
+import bcrypt
+from build_orders import app
+
+class HashPoolFull(Exception):
+    pass
+
+class HashTask(object):
+    def __init__(self, f, args):
+        self.f = f
+        self.args = args
+        self.result = self.error = None
+        self.queued = time.time()
+        self.started = self.finished = None
+        self.done = threading.Event()
+
+    def run(self):
+        self.started = time.time()
+        try:
+            self.result = self.f(*self.args)
+        except Exception, e:
+            self.error = e
+        self.finished = time.time()
+        self.done.set()
+
+class HashPool(object):
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self._tasks = Queue.Queue(queue_limit)
+        self._lock = threading.Lock()
+        self.hashed = self.rejected = 0
+        self.wait_time = self.hash_time = self.max_time = 0.0
+        for _ in xrange(workers):
+            thread = threading.Thread(target = self._work)
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            self._tasks.get().run()
+
+    def run(self, f, *args):
+        task = HashTask(f, args)
+        try:
+            self._tasks.put_nowait(task)
+        except Queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise HashPoolFull('%d hashes already waiting' %
+                    self._tasks.maxsize)
+        task.done.wait()
+        with self._lock:
+            self.hashed += 1
+            self.wait_time += task.started - task.queued
+            self.hash_time += task.finished - task.started
+            self.max_time = max(self.max_time, task.finished - task.queued)
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def metrics(self):
+        with self._lock:
+            hashed = max(self.hashed, 1)
+            return {
+                'workers': self.workers,
+                'waiting': self._tasks.qsize(),
+                'hashed': self.hashed,
+                'rejected': self.rejected,
+                'mean_wait': self.wait_time / hashed,
+                'mean_hash': self.hash_time / hashed,
+                'max_latency': self.max_time,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashPool(app.config['HASH_WORKERS'],
+                    app.config['HASH_QUEUE_LIMIT'])
+        return _pool
+
+def log_rounds(hashed):
+    return int(hashed.split('$')[2])
+
+def hash_password(password):
+    return pool().run(bcrypt.hashpw, password,
+            bcrypt.gensalt(app.config['BCRYPT_LOG_ROUNDS']))
+
+def check_password(password, hashed):
+    return pool().run(bcrypt.hashpw, password, hashed) == hashed
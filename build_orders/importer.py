@@ -0,0 +1,102 @@
+import sys, json, sqlite3
+import sc_units, sc_orders
+from build_orders import db, models
+
+def parse_line(line):
+    if line.startswith('{'):
+        data = json.loads(line)
+        return data['race'], data['units']
+    race, _, units = line.partition(':')
+    return race.strip(), [unit.strip() for unit in units.split(',')
+            if unit.strip()]
+
+def build_order(race, names):
+    if race not in sc_orders.race_builds:
+        raise Exception('unknown race %r' % race)
+    base = sc_orders.race_builds[race]
+    # Orders may leave out the race's opening units.
+    if names[:len(base._unit_order)] == map(str, base._unit_order):
+        order = sc_orders.race_orders[race]()
+    else:
+        order = base.copy()
+    for step, name in enumerate(names, 1):
+        unit = sc_units.all_gameunits.get(name)
+        if unit is None:
+            raise Exception('step %d: unknown unit %r' % (step, name))
+        if not order.can_add(unit):
+            raise Exception('step %d: %s requirements not met' % (step, name))
+        order.add_unit(unit)
+    return order
+
+class Importer(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.children = dict(((parent_id, unit_id), node_id)
+                for node_id, parent_id, unit_id in connection.execute(
+                    'SELECT id, parent_id, unit_id FROM node'))
+        self.nodes = self.builds = 0
+
+    def node(self, parent_id, index, unit_id):
+        key = parent_id, unit_id
+        node_id = self.children.get(key)
+        if node_id is None:
+            cursor = self.connection.execute('INSERT OR IGNORE INTO node '
+                    '(parent_id, "index", unit_id) VALUES (?, ?, ?)',
+                    (parent_id, index, unit_id))
+            if cursor.rowcount:
+                node_id = cursor.lastrowid
+                self.nodes += 1
+            else:
+                node_id = self.connection.execute('SELECT id FROM node '
+                        'WHERE parent_id IS ? AND unit_id = ?',
+                        key).fetchone()[0]
+            self.children[key] = node_id
+        return node_id
+
+    def add(self, race, order):
+        node_id = None
+        for index, unit in enumerate(order._unit_order):
+            node_id = self.node(node_id, index, unit.id)
+        build_id = self.connection.execute('INSERT INTO build '
+                '(race, trie_id) VALUES (?, ?)', (race, node_id)).lastrowid
+        summary = models.BuildSummary.values(order, True,
+                len(order._unit_order))
+        summary['build_id'] = build_id
+        self.connection.execute('INSERT INTO build_summary (%s) VALUES (%s)'
+                % (', '.join(summary), ', '.join('?' * len(summary))),
+                summary.values())
+        self.builds += 1
+
+def import_builds(streams, batch_size = 1000, errors = sys.stderr):
+    db.create_all()
+    connection = sqlite3.connect(db.engine.url.database,
+            isolation_level = None)
+    importer = Importer(connection)
+    rejected = pending = 0
+    try:
+        connection.execute('BEGIN')
+        for stream in streams:
+            for number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    race, names = parse_line(line)
+                    order = build_order(race, names)
+                except Exception, e:
+                    errors.write('%s:%d: %s\n' % (stream.name, number, e))
+                    rejected += 1
+                    continue
+                importer.add(race, order)
+                pending += 1
+                if pending >= batch_size:
+                    connection.execute('COMMIT')
+                    connection.execute('BEGIN')
+                    pending = 0
+        connection.execute('COMMIT')
+    except:
+        connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+    return importer.builds, importer.nodes, rejected
@@ -0,0 +1,155 @@
+import sqlite3, sqlalchemy
+import sc_units
+from build_orders import db, models
+
+def table_columns(connection, table):
+    return [row[1] for row in
+            connection.execute('PRAGMA table_info(%s)' % table)]
+
+def create_table(connection, table):
+    connection.execute(str(sqlalchemy.schema.CreateTable(table).compile(
+        db.engine)))
+    for index in table.indexes:
+        connection.execute(str(sqlalchemy.schema.CreateIndex(index).compile(
+            db.engine)))
+
+def node_unit_ids(connection, chunk_size = 10000):
+    if 'unit_id' in table_columns(connection, 'node'):
+        return False
+    connection.execute('PRAGMA legacy_alter_table = ON')
+    connection.execute('ALTER TABLE node RENAME TO node_unit_names')
+    for row in connection.execute(
+            'PRAGMA index_list(node_unit_names)').fetchall():
+        if not row[1].startswith('sqlite_autoindex'):
+            connection.execute('DROP INDEX "%s"' % row[1])
+    create_table(connection, models.Node.__table__)
+
+    # Nodes naming unknown units are dropped with everything below them;
+    # dropped maps each of those to its nearest surviving ancestor.
+    children, merged, dropped = {}, {}, {}
+    rows = connection.cursor().execute('SELECT id, parent_id, "index", '
+            'unit_name FROM node_unit_names ORDER BY id')
+    while True:
+        chunk = rows.fetchmany(chunk_size)
+        if not chunk:
+            break
+        nodes = []
+        for node_id, parent_id, index, unit_name in chunk:
+            parent_id = merged.get(parent_id, parent_id)
+            if parent_id in dropped:
+                dropped[node_id] = dropped[parent_id]
+                continue
+            if unit_name not in sc_units.all_gameunits:
+                print 'Dropping node %d, unknown unit %r' % (node_id,
+                        unit_name)
+                dropped[node_id] = parent_id
+                continue
+            key = parent_id, sc_units.all_gameunits[unit_name].id
+            if key in children:
+                merged[node_id] = children[key]
+                continue
+            children[key] = node_id
+            nodes.append((node_id, parent_id, index, key[1]))
+        connection.executemany('INSERT INTO node (id, parent_id, "index", '
+                'unit_id) VALUES (?, ?, ?, ?)', nodes)
+    connection.executemany('UPDATE build SET trie_id = ? WHERE trie_id = ?',
+            [(node_id, duplicate) for duplicate, node_id in merged.items()])
+    orphaned = []
+    for build_id, trie_id in connection.execute(
+            'SELECT id, trie_id FROM build').fetchall():
+        if trie_id not in dropped:
+            continue
+        if dropped[trie_id] is None:
+            orphaned.append(build_id)
+            continue
+        print 'Build %d now ends at node %d' % (build_id, dropped[trie_id])
+        connection.execute('UPDATE build SET trie_id = ? WHERE id = ?',
+                (dropped[trie_id], build_id))
+    if orphaned:
+        raise Exception('Builds %s start with an unknown unit; fix or '
+                'delete them and migrate again' %
+                ', '.join(map(str, orphaned)))
+    connection.execute('DROP TABLE node_unit_names')
+    connection.execute(models.Node.ROOT_INDEX)
+    return True
+
+def merge_nodes(connection, keep, duplicate):
+    pending = [(keep, duplicate)]
+    while pending:
+        keep, duplicate = pending.pop()
+        for child_id, unit_id in connection.execute('SELECT id, unit_id '
+                'FROM node WHERE parent_id = ?', (duplicate, )).fetchall():
+            existing = connection.execute('SELECT id FROM node WHERE '
+                    'parent_id = ? AND unit_id = ?',
+                    (keep, unit_id)).fetchone()
+            if existing is None:
+                connection.execute('UPDATE node SET parent_id = ? '
+                        'WHERE id = ?', (keep, child_id))
+            else:
+                pending.append((existing[0], child_id))
+        connection.execute('UPDATE build SET trie_id = ? WHERE trie_id = ?',
+                (keep, duplicate))
+        connection.execute('DELETE FROM node WHERE id = ?', (duplicate, ))
+
+def node_root_index(connection):
+    indexes = [row[1] for row in
+            connection.execute('PRAGMA index_list(node)').fetchall()]
+    if 'ix_node_root_unit_id' in indexes:
+        return False
+    for unit_id, keep in connection.execute('SELECT unit_id, MIN(id) '
+            'FROM node WHERE parent_id IS NULL GROUP BY unit_id '
+            'HAVING COUNT(*) > 1').fetchall():
+        for duplicate, in connection.execute('SELECT id FROM node WHERE '
+                'parent_id IS NULL AND unit_id = ? AND id != ?',
+                (unit_id, keep)).fetchall():
+            merge_nodes(connection, keep, duplicate)
+    connection.execute(models.Node.ROOT_INDEX)
+    return True
+
+def build_summary_listing(connection):
+    if 'features' in table_columns(connection, 'build_summary'):
+        return False
+    for column in ('features', 'units'):
+        connection.execute('ALTER TABLE build_summary ADD COLUMN %s '
+                "VARCHAR NOT NULL DEFAULT ''" % column)
+    # Rows written before these columns existed are regenerated by validate.
+    connection.execute('DELETE FROM build_summary')
+    return True
+
+def vote_build_details_index(connection):
+    indexes = [row[1] for row in
+            connection.execute('PRAGMA index_list(vote)').fetchall()]
+    if 'ix_vote_build_details_id' in indexes:
+        return False
+    connection.execute('CREATE INDEX ix_vote_build_details_id '
+            'ON vote (build_details_id)')
+    return True
+
+def drop_node_index_index(connection):
+    indexes = [row[1] for row in
+            connection.execute('PRAGMA index_list(node)').fetchall()]
+    if 'ix_node_index' not in indexes:
+        return False
+    connection.execute('DROP INDEX ix_node_index')
+    return True
+
+steps = [ node_unit_ids, node_root_index, build_summary_listing,
+        vote_build_details_index, drop_node_index_index ]
+
+def migrate():
+    db.create_all()
+    connection = sqlite3.connect(db.engine.url.database,
+            isolation_level = None)
+    try:
+        for step in steps:
+            connection.execute('BEGIN')
+            try:
+                applied = step(connection)
+            except:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+            if applied:
+                print 'Applied %s' % step.__name__
+    finally:
+        connection.close()
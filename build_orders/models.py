@@ -1,6 +1,12 @@
-import functools, operator, datetime, bcrypt
-import decorators, sc_units, sc_orders
-from build_orders import db
+import functools, operator, datetime, collections, sqlalchemy
+import caches, sc_units, sc_orders
+from build_orders import app, db, hashing
+
+order_snapshots = caches.LRUCache(4096)
+user_identities = caches.LRUCache(4096, ttl = 300)
+
+UserIdentity = collections.namedtuple('UserIdentity',
+        'id username permissions')
 
 def can_commit(*models):
     db.session.add_all(models)
@@ -13,35 +19,132 @@ def can_commit(*models):
 
 
 class Node(db.Model):
+    ANCESTRY_QUERY = '''
+        WITH RECURSIVE ancestry(id) AS (
+            SELECT :node_id
+            UNION ALL
+            SELECT node.parent_id FROM node, ancestry
+            WHERE node.id = ancestry.id AND node.parent_id IS NOT NULL)
+        SELECT node.* FROM node, ancestry
+        WHERE node.id = ancestry.id
+        ORDER BY node."index"'''
+    ANCESTRIES_QUERY = '''
+        WITH RECURSIVE ancestry(tip_id, id) AS (
+            SELECT id, id FROM node WHERE id IN (%s)
+            UNION ALL
+            SELECT ancestry.tip_id, node.parent_id FROM node, ancestry
+            WHERE node.id = ancestry.id AND node.parent_id IS NOT NULL)
+        SELECT ancestry.tip_id AS tip_id, node.* FROM node, ancestry
+        WHERE node.id = ancestry.id
+        ORDER BY ancestry.tip_id, node."index"'''
+    # SQLite treats NULL parents as distinct, so roots need their own index.
+    ROOT_INDEX = '''
+        CREATE UNIQUE INDEX ix_node_root_unit_id ON node (unit_id)
+        WHERE parent_id IS NULL'''
+    __table_args__ = (db.UniqueConstraint('parent_id', 'unit_id'), )
     id = db.Column(db.Integer, primary_key = True)
     parent_id = db.Column(db.Integer, db.ForeignKey('node.id'),
             nullable = True)
     parent = db.relationship('Node', remote_side = [ id ],
             backref = 'children')
     index = db.Column(db.Integer, nullable = False)
-    unit_name = db.Column(db.String, nullable = False)
+    unit_id = db.Column(db.Integer, nullable = False)
 
     def __init__(self, parent, index, unit_name):
         self.parent = parent
         self.index = index
-        self.unit_name = unit_name
+        self.unit_id = sc_units.all_gameunits[unit_name].id
 
     @property
     def unit(self):
-        return sc_units.all_gameunits[self.unit_name]
+        return sc_units.gameunits_by_id[self.unit_id]
+
+    @property
+    def unit_name(self):
+        return self.unit.name
+
+    @staticmethod
+    def child_of(parent, unit_name):
+        parent_id = parent and parent.id
+        unit_id = sc_units.all_gameunits[unit_name].id
+        query = Node.query.filter_by(parent_id = parent_id,
+                unit_id = unit_id)
+        node = query.first()
+        if node is None:
+            insert = Node.__table__.insert().prefix_with('OR IGNORE')
+            db.session.execute(insert,
+                    dict(parent_id = parent_id, unit_id = unit_id,
+                        index = parent and parent.index + 1 or\
+                                Build.START_INDEX))
+            node = query.first()
+        ancestry = getattr(parent, '_full_ancestry', None)
+        if ancestry is not None and node is not None:
+            node._full_ancestry = ancestry + [node]
+        return node
 
     @property
-    @decorators.apply_f(list)
     def full_ancestry(self):
-        if self.parent:
-            for more in self.parent.full_ancestry:
-                yield more
-        yield self
+        ancestry = getattr(self, '_full_ancestry', None)
+        if ancestry is None:
+            if self.id is None:
+                ancestry = (self.parent and self.parent.full_ancestry or [])\
+                        + [self]
+            else:
+                ancestry = Node.query.from_statement(
+                        db.text(Node.ANCESTRY_QUERY)).params(
+                                node_id = self.id).all()
+            self._full_ancestry = ancestry
+        return ancestry
+
+    @staticmethod
+    def preload_ancestries(nodes):
+        tips = dict((node.id, node) for node in nodes
+                if getattr(node, '_full_ancestry', None) is None)
+        if not tips:
+            return
+        params = dict(('tip_%d' % tip_id, tip_id) for tip_id in tips)
+        ancestries = dict((tip_id, []) for tip_id in tips)
+        query = db.session.query(Node, 'tip_id').from_statement(db.text(
+            Node.ANCESTRIES_QUERY % ', '.join(':' + key for key in params)))
+        for node, tip_id in query.params(**params):
+            ancestries[tip_id].append(node)
+        for tip_id, ancestry in ancestries.iteritems():
+            tips[tip_id]._full_ancestry = ancestry
+
+    def order(self, race):
+        # Snapshots are shared between callers and must not be mutated.
+        order = order_snapshots.get((race, self.id))
+        if order is not None:
+            return order
+        # A new child usually follows its parent's snapshot, which spares
+        # loading the ancestry at all.
+        if self.parent_id is not None:
+            order = order_snapshots.get((race, self.parent_id))
+        if order is not None:
+            pending = [self]
+        else:
+            pending = self.full_ancestry
+            for start in reversed(range(len(pending) - 1)):
+                order = order_snapshots.get((race, pending[start].id))
+                if order is not None:
+                    pending = pending[start + 1:]
+                    break
+        order = order.copy() if order is not None else\
+                sc_orders.race_orders[race]()
+        for node in pending:
+            order.add_unit(node.unit)
+        if self.id is not None:
+            order_snapshots.set((race, self.id), order)
+        return order
 
     def __repr__(self):
         return '<Node %d %r>' % (self.index, self.unit)
 
 
+sqlalchemy.event.listen(Node.__table__, 'after_create',
+        sqlalchemy.DDL(Node.ROOT_INDEX))
+
+
 class Build(db.Model):
     START_INDEX = 0
     id = db.Column(db.Integer, primary_key = True)
@@ -55,35 +158,47 @@ class Build(db.Model):
         self.trie = trie
 
     def add_unit(self, unit_name):
-        for child in self.trie.children:
-            if child.unit_name == unit_name and\
-                    child.index == self.next_index:
-                self.trie = child
-                db.session.commit()
-                return child
-        self.trie = Node(self.trie, self.next_index, unit_name)
-        db.session.add(self.trie)
+        parent = self.trie
+        self.trie = Node.child_of(parent, unit_name)
+        summary = self.summary
+        if summary is not None and summary.length == self.trie.index:
+            self.update_summary(summary.appended(self.race, parent,
+                self.trie))
+        else:
+            self.update_summary()
         db.session.commit()
         return self.trie
 
     @staticmethod
     def from_order(race, order):
         if order:
-            first_unit = next(iter(order._unit_order), '')
-            first_node = Node.query.filter_by(parent = None,
-                    unit_name = str(first_unit)).first()
-            if first_node:
-                build = Build(race, first_node)
-            else:
-                build = Build(race,
-                        Node(None, Build.START_INDEX, str(first_unit)))
+            trie = Node.child_of(None, str(next(iter(order._unit_order), '')))
             for unit in order._unit_order[1:]:
-                build.add_unit(str(unit))
+                trie = Node.child_of(trie, str(unit))
+            build = Build(race, trie)
+            build.update_summary()
             db.session.add(build)
             db.session.commit()
             return build
         raise Exception('Cannot initialize a build based on an empty order')
 
+    def update_summary(self, values = None):
+        if values is None:
+            try:
+                order, valid = self.order, True
+            except Exception:
+                order, valid = sc_orders.race_orders[self.race](), False
+                for unit in self.units:
+                    if not order.can_add(unit):
+                        break
+                    order.add_unit(unit)
+            values = BuildSummary.values(order, valid, self.next_index)
+        if self.summary is None:
+            self.summary = BuildSummary(self, **values)
+        else:
+            for key, value in values.iteritems():
+                setattr(self.summary, key, value)
+
     @property
     def elements(self):
         return self.trie.full_ancestry
@@ -93,28 +208,111 @@ class Build(db.Model):
         return map(operator.attrgetter('unit'), self.elements)
 
     @property
-    @decorators.apply_f(list)
     def distinguishing_features(self):
-        for point in self.elements[8:]:
-            if point.unit.allows:
-                units = map(operator.attrgetter('unit'),
-                    point.parent.full_ancestry)
-                order = sc_orders.race_orders[self.race](*units)
-                yield point.unit, order.supply
+        if self.summary is not None:
+            return self.summary.features_list
+        return self.order.distinguishing_features()
+
+    @property
+    def active_units(self):
+        if self.summary is not None:
+            return self.summary.active_units
+        return self.order.active_units
 
     @property
     def order(self):
-        return sc_orders.race_orders[self.race](*self.units)
+        return self.trie.order(self.race)
+
+    @staticmethod
+    def preload_orders(builds):
+        Node.preload_ancestries([build.trie for build in builds
+            if build.summary is None and
+            (build.race, build.trie_id) not in order_snapshots])
 
     @property
     def next_index(self):
-        indexes = map(operator.attrgetter('index'), self.elements)
-        return indexes and max(indexes) + 1 or Build.START_INDEX
+        return self.trie and self.trie.index + 1 or Build.START_INDEX
 
     def __repr__(self):
         return '<%s Build %r>' % (self.race, self.id)
 
 
+class BuildSummary(db.Model):
+    build_id = db.Column(db.Integer, db.ForeignKey('build.id'),
+            primary_key = True)
+    build = db.relationship(Build,
+            backref = db.backref('summary', uselist = False))
+    valid = db.Column(db.Boolean, nullable = False)
+    length = db.Column(db.Integer, nullable = False)
+    supply = db.Column(db.Float, nullable = False)
+    minerals = db.Column(db.Integer, nullable = False)
+    gas = db.Column(db.Integer, nullable = False)
+    features = db.Column(db.String, nullable = False, default = '')
+    units = db.Column(db.String, nullable = False, default = '')
+
+    def __init__(self, build, valid, length, supply, minerals, gas,
+            features = '', units = ''):
+        self.build = build
+        self.valid = valid
+        self.length = length
+        self.supply = supply
+        self.minerals = minerals
+        self.gas = gas
+        self.features = features
+        self.units = units
+
+    @staticmethod
+    def encode_features(features):
+        return ' '.join('%d:%r' % (unit.id, supply.amount)
+                for unit, supply in features)
+
+    @staticmethod
+    def values(order, valid, length, features = None):
+        if features is None:
+            features = BuildSummary.encode_features(
+                    order.distinguishing_features())
+        return dict(valid = valid, length = length,
+                supply = order.total(sc_units.Supply),
+                minerals = order.total(sc_units.Mineral),
+                gas = order.total(sc_units.Gas), features = features,
+                units = ' '.join(str(unit.id) for unit in order.active_units))
+
+    def appended(self, race, parent, node):
+        # Values for this summary's build with node appended to parent,
+        # its tip. An invalid build keeps the summary of its valid prefix.
+        values = dict(valid = False, length = node.index + 1,
+                supply = self.supply, minerals = self.minerals,
+                gas = self.gas, features = self.features, units = self.units)
+        if not self.valid:
+            return values
+        supply = parent.order(race).supply
+        try:
+            order = node.order(race)
+        except Exception:
+            return values
+        features = self.features
+        if node.index >= 8 and node.unit.allows:
+            features = ' '.join(filter(None, [features,
+                BuildSummary.encode_features([(node.unit, supply)])]))
+        return BuildSummary.values(order, True, node.index + 1, features)
+
+    @property
+    def features_list(self):
+        return [(sc_units.gameunits_by_id[int(unit_id)],
+            sc_units.Supply(float(amount) if '.' in amount else int(amount)))
+            for unit_id, amount in (feature.split(':')
+                for feature in self.features.split())]
+
+    @property
+    def active_units(self):
+        return [sc_units.gameunits_by_id[int(unit_id)]
+                for unit_id in self.units.split()]
+
+    def __repr__(self):
+        return '<BuildSummary %r %s>' % (self.build_id,
+                self.valid and 'valid' or 'invalid')
+
+
 class Permission(db.Model):
     id = db.Column(db.Integer, primary_key = True)
     user_id = db.Column(db.Integer,
@@ -152,14 +350,19 @@ class User(db.Model):
         return self.username
 
     def create_password(self, password):
-        return bcrypt.hashpw(password, bcrypt.gensalt())
+        return hashing.hash_password(password)
 
     def set_password(self, password):
         self.password = self.create_password(password)
         return self.password
 
     def check_password(self, password):
-        return bcrypt.hashpw(password, self.password) == self.password
+        return hashing.check_password(password, self.password)
+
+    @property
+    def needs_rehash(self):
+        return hashing.log_rounds(self.password) !=\
+                app.config['BCRYPT_LOG_ROUNDS']
 
     @property
     def permissions_list(self):
@@ -169,6 +372,21 @@ class User(db.Model):
         for permission in permissions:
             if permission not in self.permissions_list:
                 Permission(self, permission)
+        user_identities.invalidate(self.username)
+
+    @property
+    def identity(self):
+        return UserIdentity(self.id, self.username,
+                frozenset(self.permissions_list))
+
+    @staticmethod
+    def identity_of(username):
+        identity = user_identities.get(username)
+        if identity is None:
+            user = User.query.filter_by(username = username).first()
+            if user is not None:
+                identity = user_identities.set(username, user.identity)
+        return identity
 
 
 class BuildDetails(db.Model):
@@ -190,6 +408,11 @@ class BuildDetails(db.Model):
         self.description = description
         self.created = datetime.datetime.now()
 
+    @property
+    def score(self):
+        return db.session.query(Vote.score_column()).filter(
+                Vote.build_details_id == self.id).scalar() or 0
+
 
 class Vote(db.Model):
     class Values:
@@ -201,7 +424,7 @@ class Vote(db.Model):
             db.ForeignKey('user.id'), nullable = False)
     user = db.relationship(User, backref = 'votes')
     build_details_id = db.Column(db.Integer,
-            db.ForeignKey('build_details.id'), nullable = False)
+            db.ForeignKey('build_details.id'), nullable = False, index = True)
     build_details = db.relationship(BuildDetails, backref = 'votes')
     value = db.Column(db.Integer, nullable = False)
 
@@ -212,12 +435,24 @@ class Vote(db.Model):
 
     @property
     def numerical_value(self):
-        return Values.numerical[self.value]
+        return Vote.Values.numerical[self.value]
 
     @staticmethod
     def aggregated(*votes):
         return sum(map(operator.attrgetter('numerical_value'), votes))
 
+    @staticmethod
+    def score_column():
+        return db.func.sum(db.case([(Vote.value == Vote.Values.YES,
+            Vote.Values.numerical[Vote.Values.YES])],
+            else_ = Vote.Values.numerical[Vote.Values.NO]))
+
+    @staticmethod
+    def scores():
+        return db.session.query(Vote.build_details_id,
+                Vote.score_column().label('score')).group_by(
+                        Vote.build_details_id).subquery()
+
 
 players = db.Table('players',
         db.Column('player_id', db.Integer, db.ForeignKey('player.id')),
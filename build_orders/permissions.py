@@ -3,4 +3,5 @@ class Permissions:
     CREATE_EVENT = 'create_event'
     DELETE_BUILD = 'delete_build'
     DELETE_EVENT = 'delete_event'
+    VIEW_METRICS = 'view_metrics'
 
@@ -0,0 +1,145 @@
+"""
+Branch and bound search for the fastest build order reaching a goal.
+
+A goal maps units to how many of them (or of units acting as them) the
+build must contain, e.g. { lair : 1, zergling : 16 }. States are
+sc_timeline.Timeline copies; a state's cost is the time its last step
+finishes. Only units that lead towards the goal are branched on, plus
+workers, supply and gas, each capped so the search stays finite.
+"""
+import collections, time
+import sc_units, sc_orders, sc_timeline, func_utils
+
+MAX_NODES = 20000
+
+supply_providers = [ sc_units.overlord, sc_units.pylon, sc_units.supply_depot ]
+
+Result = collections.namedtuple('Result', 'timeline nodes complete')
+
+def flat_consumes(unit):
+    for more in unit.consumes:
+        if func_utils.is_iterable(more):
+            for option in more:
+                yield option
+        else:
+            yield more
+
+def relevant_units(race_units, goal):
+    relevant = []
+    pending = list(goal)
+    while pending:
+        unit = pending.pop()
+        if unit in relevant or unit not in race_units:
+            continue
+        relevant.append(unit)
+        pending.extend(unit.requirements)
+        pending.extend(flat_consumes(unit))
+        if unit.produced_by:
+            pending.append(unit.produced_by)
+    for more in sc_timeline.workers + supply_providers:
+        if more in race_units and more not in relevant:
+            relevant.append(more)
+    if any(cost.amount for unit in relevant for cost in unit.costs
+            if isinstance(cost, sc_units.Gas)):
+        relevant.extend(more for more in sc_timeline.gas_buildings
+                if more in race_units)
+    return relevant
+
+def chain_time(unit, timeline):
+    if timeline.count_acting_as(unit):
+        return 0
+    return unit.build_time + max([chain_time(req, timeline)
+        for req in unit.requirements] or [0])
+
+class Search(object):
+    def __init__(self, race, goal, max_nodes = MAX_NODES, time_limit = None):
+        race_units = sc_orders.race_builds[race]._race_units
+        for unit in goal:
+            if unit not in race_units:
+                raise Exception('%r is not a %s unit' % (unit, race))
+        self.race = race
+        self.goal = goal
+        self.relevant = relevant_units(race_units, goal)
+        self.caps = dict((unit, 1) for unit in self.relevant)
+        self.caps.update(goal)
+        self.max_nodes = max_nodes
+        self.deadline = time_limit and time.time() + time_limit
+        self.nodes = 0
+        self.best = None
+        self.best_time = None
+        self.seen = {}
+
+    def reached(self, timeline):
+        return all(timeline.count_acting_as(unit) >= count
+                for unit, count in self.goal.iteritems())
+
+    def bound(self, timeline):
+        last = timeline.steps and timeline.steps[-1].start or timeline.clock
+        return max([timeline.finish_time] + [last + chain_time(unit,
+            timeline) for unit, count in self.goal.iteritems()
+            if timeline.count_acting_as(unit) < count])
+
+    def allowed(self, timeline, unit):
+        if unit in sc_timeline.workers:
+            return timeline.count(unit) < sc_timeline.WORKERS_PER_BASE *\
+                    max(timeline.bases, 1) + timeline.gas_slots
+        if unit in supply_providers:
+            return timeline.supply + 2 >=\
+                    min(timeline.provided, sc_timeline.SUPPLY_CAP)
+        if unit in sc_timeline.gas_buildings:
+            return timeline.count(unit) < 2 * max(timeline.bases, 1)
+        return timeline.count_acting_as(unit) < self.caps[unit]
+
+    def dominated(self, timeline):
+        key = tuple(timeline.counts)
+        start = timeline.steps[-1].start
+        seen = self.seen.get(key)
+        if seen is not None and seen[0] <= start and\
+                seen[1] >= timeline.minerals and seen[2] >= timeline.gas:
+            return True
+        if seen is None or start < seen[0]:
+            self.seen[key] = (start, timeline.minerals, timeline.gas)
+        return False
+
+    def children(self, timeline):
+        for unit in self.relevant:
+            if not timeline.can_add(unit) or\
+                    not self.allowed(timeline, unit):
+                continue
+            child = timeline.copy()
+            try:
+                child.add_unit(unit)
+            except Exception:
+                continue
+            if not self.dominated(child):
+                yield self.bound(child), child
+
+    def exhausted(self):
+        return self.nodes >= self.max_nodes or\
+                (self.deadline and time.time() >= self.deadline)
+
+    def run(self):
+        start = sc_timeline.starts[self.race].copy()
+        stack = [(self.bound(start), start)]
+        while stack:
+            if self.exhausted():
+                return Result(self.best, self.nodes, False)
+            bound, timeline = stack.pop()
+            if self.best is not None and bound >= self.best_time:
+                continue
+            self.nodes += 1
+            if self.reached(timeline):
+                finish = timeline.finish_time
+                if self.best is None or finish < self.best_time:
+                    self.best, self.best_time = timeline, finish
+                continue
+            children = [(child_bound, child) for child_bound, child in
+                    self.children(timeline) if self.best is None or
+                    child_bound < self.best_time]
+            children.sort(key = lambda (child_bound, child):
+                    (child_bound, child.steps[-1].start), reverse = True)
+            stack.extend(children)
+        return Result(self.best, self.nodes, True)
+
+def optimize(race, goal, max_nodes = MAX_NODES, time_limit = None):
+    return Search(race, goal, max_nodes, time_limit).run()
@@ -1,11 +1,19 @@
 import functools, sc_units, operator, itertools
-import decorators, func_utils
+import caches, decorators, func_utils
+
+# Keyed by the mask of available units; trees are shared, do not mutate.
+tech_trees = caches.LRUCache(1024)
 
 class BuildOrder(object):
     def __init__(self, race_units, *units):
         self._race_units = race_units
-        self._unit_order = []
-        self._units = []
+        # (earlier steps, unit) pairs; copies share the prefix.
+        self._steps = None
+        self._counts = {}
+        self._available = {}
+        self._totals = {}
+        self._active_mask = 0
+        self._available_mask = 0
         for unit in units:
             self.add_unit(unit)
 
@@ -13,22 +21,45 @@ class BuildOrder(object):
     def based_on(cls, base):
         return cls(base._race_units, *base._unit_order)
 
+    def copy(self):
+        order = self.__class__(self._race_units)
+        order._steps = self._steps
+        order._counts = self._counts.copy()
+        order._available = self._available.copy()
+        order._totals = self._totals.copy()
+        order._active_mask = self._active_mask
+        order._available_mask = self._available_mask
+        return order
+
+    @property
+    def _unit_order(self):
+        units, steps = [], self._steps
+        while steps is not None:
+            steps, unit = steps
+            units.append(unit)
+        units.reverse()
+        return units
+
     @property
+    @decorators.apply_f(list)
     def active_units(self):
-        return self._units
+        for unit in sorted(self._counts, key = operator.attrgetter('id')):
+            for more in itertools.repeat(unit, self._counts[unit]):
+                yield more
 
     @decorators.apply_f(list)
     def get_costs(self, *resources):
-        costs = reduce(operator.add, 
-                map(operator.attrgetter('costs'), self.active_units))
         for resource in resources or sc_units.game_resources:
-            combined = resource.combine_resources(*costs)
-            if combined.amount:
-                yield combined
+            amount = self._totals.get(resource, 0)
+            if amount:
+                yield resource(amount)
+
+    def total(self, resource):
+        return self._totals.get(resource, 0)
 
     @property
     def supply(self):
-        return next(iter(self.get_costs(sc_units.Supply)), sc_units.Supply(0))
+        return sc_units.Supply(self._totals.get(sc_units.Supply, 0))
 
     @property
     @decorators.apply_f(list)
@@ -38,30 +69,73 @@ class BuildOrder(object):
 
     @property
     def available_tech(self):
-        return filter(operator.methodcaller('valid_with_respect_to',
-            self.active_units,
-            self.available_units), self._race_units)
+        return filter(self.can_add, self._race_units)
 
     @property
     def available_tech_tree(self):
-        tech_tree = {}
-        for unit, tech_path in zip(self.available_tech,
-                map(operator.attrgetter('full_requirements'),
-                    self.available_tech)):
-            func_utils.dict_create_path(tech_path,
-                    tech_tree).update({ unit : {} })
+        available = self.available_tech
+        mask = reduce(operator.or_, (unit.bit for unit in available), 0)
+        tech_tree = tech_trees.get(mask)
+        if tech_tree is None:
+            tech_tree = {}
+            for unit in available:
+                func_utils.dict_create_path(unit.full_requirements,
+                        tech_tree).update({ unit : {} })
+            tech_trees.set(mask, tech_tree)
         return tech_tree
 
-    def add_unit(self, unit):
-        if unit.valid_with_respect_to(self.active_units,
-                self.available_units):
-            for more in unit.consumes_with_respect_to(self.active_units):
-                self._units.remove(more)
-            self._unit_order.append(unit)
-            for more in sc_units.unit_wrapper(unit):
-                self._units.append(more)
+    @decorators.apply_f(list)
+    def distinguishing_features(self, start = 8):
+        replay = self.__class__(self._race_units)
+        for index, unit in enumerate(self._unit_order):
+            if index >= start and unit.allows:
+                yield unit, replay.supply
+            replay.add_unit(unit)
+
+    def consumed_by(self, unit):
+        if unit.requirements_mask & ~self._available_mask:
+            return None
+        return unit.consumes_from(self._counts, self._active_mask)
+
+    def can_add(self, unit):
+        return self.consumed_by(unit) is not None
+
+    def produce(self, unit):
+        counts, available, totals = self._counts, self._available, self._totals
+        counts[unit] = counts.get(unit, 0) + 1
+        self._active_mask |= unit.bit
+        for more in unit.acts_as:
+            available[more] = available.get(more, 0) + 1
+        self._available_mask |= unit.acts_as_mask
+        for cost in unit.costs:
+            totals[cost.__class__] = totals.get(cost.__class__, 0) +\
+                    cost.amount
+
+    def consume(self, unit):
+        counts, available, totals = self._counts, self._available, self._totals
+        if counts[unit] > 1:
+            counts[unit] -= 1
         else:
+            del counts[unit]
+            self._active_mask &= ~unit.bit
+        for more in unit.acts_as:
+            if available[more] > 1:
+                available[more] -= 1
+            else:
+                del available[more]
+                self._available_mask &= ~more.bit
+        for cost in unit.costs:
+            totals[cost.__class__] -= cost.amount
+
+    def add_unit(self, unit):
+        consumed = self.consumed_by(unit)
+        if consumed is None:
             raise Exception('%r requirements not met' % unit)
+        for more in consumed:
+            self.consume(more)
+        self._steps = self._steps, unit
+        for more in sc_units.unit_wrapper(unit):
+            self.produce(more)
         return self
 
 ZERG = functools.partial(BuildOrder, sc_units.zerg_units)
@@ -0,0 +1,507 @@
+"""
+Discrete event simulation of a build order in game time.
+
+Steps are issued in order, each no earlier than the one before it, as soon
+as the bank covers its cost, its requirements and consumed units have
+finished, a producer (or larva) is idle and supply allows it. Workers
+saturate gas geysers first, but with at most half of them, and mine
+minerals up to WORKERS_PER_BASE per town hall; workers no town hall has
+room for go to gas as well. Workers are not taken off mining while
+constructing.
+
+The timeline keeps its own unit counts in lists indexed by unit id, both
+for the issued order and for finished units, rather than a pair of
+BuildOrders; the per step work is what bounds how many builds a second
+can be simulated.
+"""
+import collections, functools, heapq, operator
+import sc_units, sc_orders
+
+MINERALS_PER_WORKER = 0.7
+GAS_PER_WORKER = 0.6
+WORKERS_PER_BASE = 16
+WORKERS_PER_GEYSER = 3
+LARVA_INTERVAL = 11
+LARVA_PER_HATCHERY = 3
+STARTING_MINERALS = 50
+SUPPLY_CAP = 200
+NEVER = float('inf')
+
+workers = [ sc_units.drone, sc_units.probe, sc_units.scv ]
+townhalls = [ sc_units.hatchery, sc_units.nexus, sc_units.command_center ]
+gas_buildings = [ sc_units.extractor, sc_units.assimilator, sc_units.refinery ]
+
+# zerg_base leaves out the overlord every zerg game starts with
+starting_supply = {
+    sc_units.Races.ZERG: sc_units.overlord.provides,
+}
+
+producer_mask = reduce(operator.or_, (unit.produced_by.bit
+    for unit in sc_units.gameunits_by_id if unit.produced_by), 0)
+
+def cost_of(unit, resource):
+    return sum(cost.amount for cost in unit.costs
+            if isinstance(cost, resource))
+
+def holds_slot(unit):
+    return bool(unit.acts_as_mask & producer_mask)
+
+def economy(units):
+    # Supply provided, workers, town halls and gas worker slots.
+    return (sum(unit.provides for unit in units),
+            sum(unit in workers and 1 or 0 for unit in units),
+            sum(unit.acts_as_mask & more.bit and 1 or 0
+                for unit in units for more in townhalls),
+            sum(unit in gas_buildings and WORKERS_PER_GEYSER or 0
+                for unit in units))
+
+def mining_rates(workers, bases, gas_slots):
+    # Minerals and gas mined per second. Gas never takes more than half the
+    # workers, so minerals keep coming while there is a worker and a town
+    # hall; a lone worker splits its time.
+    mineral_room = WORKERS_PER_BASE * bases
+    mining_gas = workers // 2 if workers != 1 else 0.5
+    if workers - mineral_room > mining_gas:
+        mining_gas = workers - mineral_room
+    if gas_slots < mining_gas:
+        mining_gas = gas_slots
+    mining_minerals = workers - mining_gas
+    if mining_minerals > mineral_room:
+        mining_minerals = mineral_room
+    return (MINERALS_PER_WORKER * mining_minerals,
+            GAS_PER_WORKER * mining_gas)
+
+def unit_slot(slots, unit_id):
+    # The slot of a unit_id unit that frees up first.
+    free = None
+    for slot in slots:
+        if slot[1] == unit_id and (free is None or slot[0] < free[0]):
+            free = slot
+    return free
+
+def producer_slot(slots, producer):
+    # The slot of a unit acting as the producer that frees up first.
+    free = None
+    for slot in slots:
+        if slot[2] & producer and (free is None or slot[0] < free[0]):
+            free = slot
+    return free
+
+def larva_hatchery(hatcheries):
+    # A hatchery with a larva, or the one that grows one first.
+    free = None
+    for hatchery in hatcheries:
+        if hatchery[0] >= 1:
+            return hatchery
+        if free is None or hatchery[1] < free[1]:
+            free = hatchery
+    return free
+
+def changes(removed, added):
+    # Net count changes, split into (unit id, amount, bit) lost and gained;
+    # a counter's mask has a unit's bit while its count is above zero.
+    deltas = collections.Counter()
+    deltas.subtract(removed)
+    deltas.update(added)
+    deltas = sorted(deltas.items(), key = lambda (unit, delta): unit.id)
+    return (tuple((unit.id, -delta, unit.bit) for unit, delta in deltas
+                if delta < 0),
+            tuple((unit.id, delta, unit.bit) for unit, delta in deltas
+                if delta > 0))
+
+def acting_as(units):
+    return [more for unit in units for more in unit.acts_as]
+
+def economy_change(workers, bases, gas_slots):
+    return (workers, bases, gas_slots) if workers or bases or gas_slots\
+            else None
+
+# A morph completing: what the morphed units stop completing as, and the
+# unit and acts_as_mask its producer slot takes on.
+Morph = collections.namedtuple('Morph', 'completed unit_id acts_as_mask')
+
+class Finish(collections.namedtuple('Finish', 'completed spare supply_cap '
+        'economy morph slots hatcheries')):
+    # What finishing a step changes: what it completes as and the spare
+    # units it yields, supply provided and the (workers, bases, gas slots)
+    # change if any. Anything but a morph adds its producer slots and
+    # hatcheries.
+    @classmethod
+    def of(cls, unit, morphed):
+        yields = sc_units.unit_wrapper(unit)
+        supply_cap, workers, bases, gas_slots = [more - less for more, less
+                in zip(economy(yields), economy(morphed))]
+        lost, gained = changes(acting_as(morphed), acting_as(yields))
+        return cls(gained, tuple(more.id for more in yields), supply_cap,
+                economy_change(workers, bases, gas_slots),
+                Morph(lost, unit.id, unit.acts_as_mask) if morphed else None,
+                tuple((more.id, more.acts_as_mask) for more in yields
+                    if not morphed and holds_slot(more)),
+                sum(1 for more in yields if not morphed and
+                    more.acts_as_mask & sc_units.hatchery.bit))
+
+# Issuing a step: the supply used grows by supply, and counts and acting
+# change by (unit id, delta) and (unit id, count, bit) respectively.
+Issue = collections.namedtuple('Issue', 'supply counts acting')
+
+# Consumed units taken from the timeline as the step is issued: what they
+# acted as, those not morphed that stop being completed right away, and
+# the supply provided and economy lost with them.
+Removal = collections.namedtuple('Removal', 'acting completed supply_cap '
+        'economy')
+
+class Consumption(collections.namedtuple('Consumption', 'needed held '
+        'morphs supply issue removal finish')):
+    # One way of paying a unit's consumes. needed pairs consumed unit ids
+    # with counts, held is the id of the consumed unit holding a producer
+    # slot, if any, and morphs whether it keeps that slot. supply is what
+    # must be free to issue the step.
+    @classmethod
+    def of(cls, unit, sub, needed):
+        yields = sc_units.unit_wrapper(unit)
+        morphed = [more for more in sub if unit.acts_as_mask & more.bit]
+        removed = [more for more in sub if more not in morphed]
+        held = [more for more in sub if holds_slot(more)]
+        if len(held) > 1:
+            raise Exception('%r consumes more than one producer' % unit)
+        consumed_supply = sum(cost_of(more, sc_units.Supply) for more in sub)
+        lost, gained = changes(sub, yields)
+        acting_lost, acting_gained = changes(acting_as(sub), acting_as(yields))
+        supply_cap, workers, bases, _ = economy(removed)
+        count_changes = tuple((unit_id, -delta) for unit_id, delta, _ in lost)\
+                + tuple((unit_id, delta) for unit_id, delta, _ in gained)
+        return cls(tuple((more.id, count) for more, count in needed.items()),
+                held[0].id if held else None,
+                bool(held and held[0] in morphed),
+                cost_of(unit, sc_units.Supply) - consumed_supply,
+                Issue(sum(cost_of(more, sc_units.Supply) for more in yields) -
+                    consumed_supply, count_changes, acting_gained),
+                Removal(acting_lost, changes(acting_as(removed), ())[0],
+                    -supply_cap, economy_change(-workers, -bases, 0))
+                if sub else None,
+                Finish.of(unit, morphed))
+
+class UnitSpec(collections.namedtuple('UnitSpec', 'minerals gas build_time '
+        'requires producer larva options always')):
+    # always is the option taken whatever has been issued, when the first
+    # one consumes nothing.
+    @classmethod
+    def of(cls, unit):
+        options = tuple(Consumption.of(unit, sub, needed)
+                for sub, needed, _ in unit._consume_options)
+        if (unit.larva or unit.produced_by) and\
+                any(option.held is not None for option in options):
+            raise Exception('%r takes more than one producer slot' % unit)
+        return cls(cost_of(unit, sc_units.Mineral),
+                cost_of(unit, sc_units.Gas), unit.build_time,
+                unit.requirements_mask,
+                unit.produced_by and unit.produced_by.bit or 0, unit.larva,
+                options, options[0] if not options[0].needed else None)
+
+specs = [UnitSpec.of(unit) for unit in sc_units.gameunits_by_id]
+
+Step = collections.namedtuple('Step', 'unit start finish minerals gas supply')
+# Skips Step.__new__'s Python level call in the step loop.
+new_step = functools.partial(tuple.__new__, Step)
+
+class Timeline(object):
+    def __init__(self, race):
+        base = sc_orders.race_builds[race]
+        self.race = race
+        self.units = list(base._unit_order)
+        # Issued units: counts, how many act as each unit and supply used.
+        self.counts = [0] * len(specs)
+        self.acting = [0] * len(specs)
+        for unit, count in base._counts.iteritems():
+            self.counts[unit.id] = count
+        for unit, count in base._available.iteritems():
+            self.acting[unit.id] = count
+        self.acting_mask = base._available_mask
+        self.supply = base.total(sc_units.Supply)
+        # Finished units: spare ones not consumed or being morphed, and how
+        # many act as each unit for requirements. The base starts finished.
+        self.spare = self.counts[:]
+        self.completed = self.acting[:]
+        self.completed_mask = self.acting_mask
+        self.clock = 0.0
+        self.minerals = STARTING_MINERALS
+        self.gas = 0.0
+        supply_cap, self.workers, self.bases, self.gas_slots =\
+                economy(base.active_units)
+        self.supply_cap = starting_supply.get(race, 0) + supply_cap
+        self.mineral_rate, self.gas_rate = mining_rates(self.workers,
+                self.bases, self.gas_slots)
+        # Producer slots are [free_at, unit id, acts_as_mask]; a morphing
+        # unit's slot has no unit until the morph finishes. Hatcheries are
+        # [larva, since].
+        self.slots = [[0.0, unit.id, unit.acts_as_mask]
+                for unit in base.active_units if holds_slot(unit)]
+        self.hatcheries = [[LARVA_PER_HATCHERY, 0.0]
+                for unit in base.active_units
+                if unit.acts_as_mask & sc_units.hatchery.bit]
+        self.events = []
+        self.steps = []
+        self.supply_blocked = []
+
+    def copy(self):
+        timeline = self.__class__.__new__(self.__class__)
+        timeline.__dict__.update(self.__dict__)
+        timeline.units = self.units[:]
+        timeline.counts = self.counts[:]
+        timeline.acting = self.acting[:]
+        timeline.spare = self.spare[:]
+        timeline.completed = self.completed[:]
+        timeline.hatcheries = map(list, self.hatcheries)
+        if any(event[-1] for event in self.events):
+            slots = dict((id(slot), slot[:]) for slot in self.slots)
+            timeline.slots = [slots[id(slot)] for slot in self.slots]
+            timeline.events = [event[:-1] +
+                    (event[-1] and slots[id(event[-1])], )
+                    for event in self.events]
+        else:
+            timeline.slots = map(list, self.slots)
+            timeline.events = self.events[:]
+        timeline.steps = self.steps[:]
+        timeline.supply_blocked = self.supply_blocked[:]
+        return timeline
+
+    @property
+    def finish_time(self):
+        return max([self.clock] + [step.finish for step in self.steps])
+
+    @property
+    def provided(self):
+        return sum(count * sc_units.gameunits_by_id[unit_id].provides
+                for unit_id, count in enumerate(self.counts) if count)
+
+    def count(self, unit):
+        return self.counts[unit.id]
+
+    def count_acting_as(self, unit):
+        return self.acting[unit.id]
+
+    def consumption(self, unit):
+        spec = specs[unit.id]
+        if spec.requires & ~self.acting_mask:
+            return None
+        for option in spec.options:
+            if all(self.counts[more] >= count
+                    for more, count in option.needed):
+                return option
+        return None
+
+    def can_add(self, unit):
+        return self.consumption(unit) is not None
+
+    def add_unit(self, unit):
+        self.extend((unit, ))
+        return self.steps[-1]
+
+    def extend(self, units):
+        # The simulator's hot path. State lives in locals for the whole
+        # loop and is written back even when a step cannot be added; what a
+        # step or a finishing unit changes comes precomputed from specs.
+        counts, acting, spare, completed = self.counts, self.acting,\
+                self.spare, self.completed
+        slots, hatcheries, events, steps = self.slots, self.hatcheries,\
+                self.events, self.steps
+        issued, supply_blocked = self.units, self.supply_blocked
+        acting_mask, completed_mask = self.acting_mask, self.completed_mask
+        clock, minerals, gas = self.clock, self.minerals, self.gas
+        mineral_rate, gas_rate = self.mineral_rate, self.gas_rate
+        workers, bases, gas_slots = self.workers, self.bases, self.gas_slots
+        supply, supply_cap = self.supply, self.supply_cap
+        heappop, heappush = heapq.heappop, heapq.heappush
+        try:
+            for unit in units:
+                minerals_cost, gas_cost, build_time, requires, producer,\
+                        larva, options, option = specs[unit.id]
+                if option is None:
+                    for more in options:
+                        for more_id, count in more.needed:
+                            if counts[more_id] < count:
+                                break
+                        else:
+                            option = more
+                            break
+                if option is None or requires & ~acting_mask:
+                    raise Exception('%r requirements not met' % unit)
+                needed, held, morphs, supply_used, issue, removal,\
+                        finish_changes = option
+
+                # Finish events until the step can start no later than the
+                # next one. A step still short of minerals when the next
+                # event finishes cannot start before it, so its other needs
+                # are only checked once that changes, or while it is held up
+                # by supply and when that began is not known yet.
+                supplied = supply_used <= 0
+                blocked = None
+                placed = False
+                while True:
+                    if supply_used > 0:
+                        supplied = supply + supply_used <=\
+                                (supply_cap if supply_cap < SUPPLY_CAP
+                                    else SUPPLY_CAP)
+                    start = NEVER
+                    if not requires & ~completed_mask:
+                        if minerals_cost <= minerals:
+                            start = clock
+                        elif mineral_rate:
+                            start = clock + (minerals_cost - minerals) /\
+                                    mineral_rate
+                    if start < NEVER and (not events or start <= events[0][0]
+                            or not supplied and blocked is None):
+                        if not placed:
+                            # The hatchery or producer slot the step takes,
+                            # and when it is ready, only change as finishing
+                            # units add or morph them.
+                            ready = 0
+                            if larva:
+                                place = larva_hatchery(hatcheries)
+                                if place is None:
+                                    ready = NEVER
+                                elif place[0] < 1:
+                                    ready = place[1] + LARVA_INTERVAL
+                            elif producer or held is not None:
+                                place = producer_slot(slots, producer)\
+                                        if producer else unit_slot(slots, held)
+                                ready = NEVER if place is None else place[0]
+                            placed = True
+                        if ready > start:
+                            start = ready
+                        if gas_cost > gas:
+                            if gas_rate:
+                                at = clock + (gas_cost - gas) / gas_rate
+                                if at > start:
+                                    start = at
+                            else:
+                                start = NEVER
+                        for more_id, count in needed:
+                            if spare[more_id] < count:
+                                start = NEVER
+                        if start < NEVER and not supplied and blocked is None:
+                            blocked = start
+                        if start < NEVER and supplied and\
+                                (not events or start <= events[0][0]):
+                            break
+                    if not events:
+                        if start < NEVER:
+                            raise Exception('%r needs more supply than the '
+                                    'order provides' % unit)
+                        if minerals_cost > minerals and not mineral_rate or\
+                                gas_cost > gas and not gas_rate:
+                            raise Exception('%r can never be paid for, '
+                                    'nothing mines what it costs' % unit)
+                        raise Exception('%r can never be started' % unit)
+
+                    time, _, finished, morph_slot = heappop(events)
+                    if time > clock:
+                        minerals += mineral_rate * (time - clock)
+                        gas += gas_rate * (time - clock)
+                        clock = time
+                    gained, yielded, provided, change, morph, new_slots,\
+                            new_hatcheries = finished
+                    for more_id, count, bit in gained:
+                        completed[more_id] += count
+                        completed_mask |= bit
+                    for more_id in yielded:
+                        spare[more_id] += 1
+                    supply_cap += provided
+                    if morph is not None:
+                        for more_id, count, bit in morph.completed:
+                            completed[more_id] -= count
+                            if not completed[more_id]:
+                                completed_mask &= ~bit
+                        if morph_slot is not None:
+                            morph_slot[1], morph_slot[2] = morph.unit_id,\
+                                    morph.acts_as_mask
+                            placed = False
+                    elif new_slots or new_hatcheries:
+                        for more_id, more_mask in new_slots:
+                            slots.append([time, more_id, more_mask])
+                        if new_hatcheries:
+                            hatcheries.append([1, time])
+                        placed = False
+                    if change is not None:
+                        workers += change[0]
+                        bases += change[1]
+                        gas_slots += change[2]
+                        mineral_rate, gas_rate = mining_rates(workers, bases,
+                                gas_slots)
+
+                if blocked is not None and blocked < start:
+                    supply_blocked.append((blocked, start))
+                if start > clock:
+                    minerals += mineral_rate * (start - clock)
+                    gas += gas_rate * (start - clock)
+                    clock = start
+                minerals -= minerals_cost
+                gas -= gas_cost
+                finish = start + build_time
+
+                # Issue the step. Morphed units stay finished, and keep
+                # meeting requirements, until the morph completes.
+                supply_change, count_changes, acting_gained = issue
+                for more_id, delta in count_changes:
+                    counts[more_id] += delta
+                for more_id, count, bit in acting_gained:
+                    acting[more_id] += count
+                    acting_mask |= bit
+                supply += supply_change
+                issued.append(unit)
+                if removal is not None:
+                    for more_id, count, bit in removal.acting:
+                        acting[more_id] -= count
+                        if not acting[more_id]:
+                            acting_mask &= ~bit
+                    for more_id, count in needed:
+                        spare[more_id] -= count
+                    for more_id, count, bit in removal.completed:
+                        completed[more_id] -= count
+                        if not completed[more_id]:
+                            completed_mask &= ~bit
+                    supply_cap += removal.supply_cap
+                    change = removal.economy
+                    if change is not None:
+                        workers += change[0]
+                        bases += change[1]
+                        mineral_rate, gas_rate = mining_rates(workers, bases,
+                                gas_slots)
+                morph_slot = None
+                if larva:
+                    count, since = place
+                    grown = count + (start - since) // LARVA_INTERVAL
+                    if grown >= LARVA_PER_HATCHERY:
+                        grown, since = LARVA_PER_HATCHERY, start
+                    else:
+                        since += (grown - count) * LARVA_INTERVAL
+                    place[0], place[1] = grown - 1, since
+                elif producer:
+                    place[0] = finish
+                elif held is not None:
+                    if morphs:
+                        place[:] = [finish, None, 0]
+                        morph_slot = place
+                    else:
+                        slots.remove(place)
+                heappush(events, (finish, len(steps), finish_changes,
+                    morph_slot))
+                steps.append(new_step((unit, start, finish, minerals, gas,
+                    supply)))
+        finally:
+            self.acting_mask, self.completed_mask = acting_mask, completed_mask
+            self.clock, self.minerals, self.gas = clock, minerals, gas
+            self.mineral_rate, self.gas_rate = mineral_rate, gas_rate
+            self.workers, self.bases, self.gas_slots =\
+                    workers, bases, gas_slots
+            self.supply, self.supply_cap = supply, supply_cap
+        return self
+
+starts = dict((race, Timeline(race)) for race in sc_orders.race_builds)
+
+def simulate(race, units):
+    timeline = starts[race].copy()
+    base = starts[race].units
+    if list(units[:len(base)]) != base:
+        raise Exception('Order does not start from the %s base' % race)
+    return timeline.extend(units[len(base):])
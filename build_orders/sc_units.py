@@ -1,9 +1,14 @@
-import functools, operator, itertools
+import functools, operator, itertools, collections, hashlib
 import decorators, func_utils
 
 all_gameunits = {}
+gameunits_by_id = []
 
 def register_gameunit(unit):
+    # Ids are stored in the build trie; define new units after existing ones.
+    unit.id = len(gameunits_by_id)
+    unit.bit = 1 << unit.id
+    gameunits_by_id.append(unit)
     all_gameunits[str(unit)] = unit
 
 class GameResource(object):
@@ -39,13 +44,18 @@ game_resources = [Mineral, Gas, Supply]
 
 class GameUnit(object):
     def __init__(self, name, reqs = (), costs = (),
-            consumes = (), acts_as = (), yields = ()):
+            consumes = (), acts_as = (), yields = (),
+            build_time = 0, provides = 0, produced_by = None, larva = False):
         self.name = name
         self._reqs = reqs
         self._costs = costs
         self._consumes = consumes
         self._acts_as = acts_as
         self._yields = yields
+        self._build_time = build_time
+        self._provides = provides
+        self._produced_by = produced_by
+        self._larva = larva
         self._deps = []
         register_gameunit(self)
         for req in self._reqs:
@@ -55,6 +65,15 @@ class GameUnit(object):
         if other not in self._deps:
             self._deps.append(other)
 
+    def consumes_from(self, counts, mask):
+        for sub, needed, needed_mask in self._consume_options:
+            if needed_mask & ~mask:
+                continue
+            if len(needed) == len(sub) or all(counts.get(unit, 0) >= count
+                    for unit, count in needed.iteritems()):
+                return sub
+        return None
+
     def valid_with_respect_to(self, active, available):
         try:
             self.consumes_with_respect_to(active)
@@ -70,81 +89,96 @@ class GameUnit(object):
         return self._reqs
 
     @property
-    @decorators.apply_f(list)
     def full_requirements(self):
-        sofar = []
-        for req in self._reqs:
-            for more in req.full_requirements:
-                if more not in sofar:
-                    sofar.append(more)
-                    yield more
-            if req not in sofar:
-                sofar.append(req)
-                yield req
+        return self._full_requirements
 
     @property
     def costs(self):
         return self._costs
 
     @property
-    @decorators.apply_f(list)
     def full_costs(self):
-        costs = reduce(operator.add, map(operator.attrgetter('costs'),
-            self.full_requirements)) + self.costs
-        for resource in game_resources:
-            combined = resource.combine_resources(*costs)
-            if combined.amount:
-                yield combined
+        return self._full_costs
 
     @property
     def consumes(self):
         return self._consumes
 
     def consumes_with_respect_to(self, active):
-        def can_remove_each(_remove_from, removed):
-            remove_from = _remove_from[:]
-            for elem in removed:
-                if elem in remove_from:
-                    remove_from.remove(elem)
-                else:
-                    return False
-            return True
-        if any(map(func_utils.is_iterable, self.consumes)):
-            for sub in self.consumes:
-                if not func_utils.is_iterable(sub):
-                    sub = [sub]
-                if can_remove_each(active, sub):
-                    return sub
-        else:
-            if can_remove_each(active, self.consumes):
-                return self.consumes
-        raise Exception('%s attempted tricky consume' % self)
+        counts = collections.Counter(active)
+        consumed = self.consumes_from(counts,
+                reduce(operator.or_, (unit.bit for unit in counts), 0))
+        if consumed is None:
+            raise Exception('%s attempted tricky consume' % self)
+        return consumed
 
     @property
     def yields(self):
         return self._yields
 
     @property
-    @decorators.apply_f(list)
+    def build_time(self):
+        return self._build_time
+
+    @property
+    def provides(self):
+        return self._provides_closure
+
+    @property
+    def produced_by(self):
+        return self._produced_by
+
+    @property
+    def larva(self):
+        return self._larva
+
+    @property
     def full_consumes(self):
-        _consumes = reduce(operator.add,
-                [req.consumes for req in self.full_requirements])
-        _consumes += self.consumes
-        for c in _consumes:
-            yield c
+        return self._full_consumes
 
     @property
     def allows(self):
-        return self._deps
+        return self._allows
 
     @property
     def acts_as(self):
-        sofar = [self]
+        return self._acts_as_closure
+
+    def finalize(self):
+        full_requirements = []
+        for req in self._reqs:
+            for more in req.full_requirements + (req, ):
+                if more not in full_requirements:
+                    full_requirements.append(more)
+        self._full_requirements = tuple(full_requirements)
+        costs = list(itertools.chain(self.costs,
+            *[req.costs for req in full_requirements]))
+        self._full_costs = tuple(combined for combined in
+                (resource.combine_resources(*costs)
+                    for resource in game_resources) if combined.amount)
+        self._full_consumes = tuple(itertools.chain(
+            *[req.consumes for req in full_requirements] + [self.consumes]))
+        acts_as = [self]
         for unit in self._acts_as:
             for more in unit.acts_as:
-                if more not in sofar:
-                    sofar.append(more)
-        return sofar
+                if more not in acts_as:
+                    acts_as.append(more)
+        self._acts_as_closure = tuple(acts_as)
+        self._provides_closure = max(unit._provides for unit in acts_as)
+        self._allows = tuple(self._deps)
+
+        self.requirements_mask = reduce(operator.or_,
+                (req.bit for req in self._reqs), 0)
+        self.acts_as_mask = reduce(operator.or_,
+                (unit.bit for unit in acts_as), 0)
+        if any(map(func_utils.is_iterable, self.consumes)):
+            options = [sub if func_utils.is_iterable(sub) else [sub]
+                    for sub in self.consumes]
+        else:
+            options = [self.consumes]
+        self._consume_options = tuple((sub, collections.Counter(sub),
+            reduce(operator.or_, (unit.bit for unit in sub), 0))
+            for sub in options)
 
     @property
     def data_obj(self):
@@ -161,6 +195,12 @@ class GameUnit(object):
     def __str__(self):
         return self.name
 
+def finalize_gameunits():
+    # Requirements and acts_as always refer to units defined earlier, so a
+    # single pass in definition order sees every dependency finalized.
+    for unit in gameunits_by_id:
+        unit.finalize()
+
 @decorators.apply_f(list)
 def unit_wrapper(unit):
     if unit.yields:
@@ -283,58 +323,75 @@ Zerg structures
 """
 
 drone = GameUnit(UnitNames.drone,
-        costs = [Mineral(50), Supply(1)])
+        costs = [Mineral(50), Supply(1)],
+        build_time = 17, larva = True)
 hatchery = GameUnit(UnitNames.hatchery,
         costs = [Mineral(300)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 100, provides = 2)
 extractor = GameUnit(UnitNames.extractor,
         costs = [Mineral(25)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 30)
 spawning_pool = GameUnit(UnitNames.spawning_pool, [hatchery],
         costs = [Mineral(200)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 65)
 evolution_chamber = GameUnit(UnitNames.evolution_chamber, [hatchery],
         costs = [Mineral(75)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 35)
 spore_crawler = GameUnit(UnitNames.spore_crawler, [evolution_chamber],
         costs = [Mineral(75)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 30)
 spine_crawler = GameUnit(UnitNames.spine_crawler, [spawning_pool],
         costs = [Mineral(100)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 50)
 baneling_nest = GameUnit(UnitNames.baneling_nest, [spawning_pool],
         costs = [Mineral(100), Gas(50)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 60)
 roach_warren = GameUnit(UnitNames.roach_warren, [spawning_pool],
         costs = [Mineral(150)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 55)
 lair = GameUnit(UnitNames.lair, [spawning_pool],
         costs = [Mineral(150), Gas(100)],
         consumes = [hatchery],
-        acts_as = [hatchery])
+        acts_as = [hatchery],
+        build_time = 80)
 nydus_network = GameUnit(UnitNames.nydus_network, [lair],
         costs = [Mineral(150), Gas(200)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 50)
 infestation_pit = GameUnit(UnitNames.infestation_pit, [lair],
         costs = [Mineral(100), Gas(100)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 50)
 spire = GameUnit(UnitNames.spire, [lair],
         costs = [Mineral(200), Gas(200)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 100)
 hydralisk_den = GameUnit(UnitNames.hydralisk_den, [lair],
         costs = [Mineral(100), Gas(100)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 40)
 hive = GameUnit(UnitNames.hive, [infestation_pit],
         costs = [Mineral(200), Gas(150)],
         consumes = [lair],
-        acts_as = [lair])
+        acts_as = [lair],
+        build_time = 100)
 ultralisk_den = GameUnit(UnitNames.ultralisk_den, [hive],
         costs = [Mineral(150), Gas(200)],
-        consumes = [drone])
+        consumes = [drone],
+        build_time = 65)
 greater_spire = GameUnit(UnitNames.greater_spire, [hive],
         costs = [Mineral(100), Gas(150)],
         consumes = [spire],
-        acts_as = [spire])
+        acts_as = [spire],
+        build_time = 100)
 
 
 """
@@ -342,35 +399,48 @@ Zerg units
 """
 
 overlord = GameUnit(UnitNames.overlord,
-        costs = [Mineral(100)])
+        costs = [Mineral(100)],
+        build_time = 25, provides = 8, larva = True)
 zergling = GameUnit(UnitNames.zergling, [spawning_pool],
-        costs = [Mineral(25), Supply(.5)])
+        costs = [Mineral(25), Supply(.5)],
+        build_time = 24, larva = True)
 overseer = GameUnit(UnitNames.overseer, [lair],
         costs = [Mineral(50), Gas(50)],
         consumes = [overlord],
-        acts_as = [overlord])
+        acts_as = [overlord],
+        build_time = 17)
 queen = GameUnit(UnitNames.queen, [spawning_pool],
-        costs = [Mineral(150), Supply(2)])
+        costs = [Mineral(150), Supply(2)],
+        build_time = 50, produced_by = hatchery)
 ultralisk = GameUnit(UnitNames.ultralisk, [ultralisk_den],
-        costs = [Mineral(300), Gas(200), Supply(6)])
+        costs = [Mineral(300), Gas(200), Supply(6)],
+        build_time = 70, larva = True)
 nydus_worm = GameUnit(UnitNames.nydus_worm, [nydus_network],
-        costs = [Mineral(100), Gas(100)])
+        costs = [Mineral(100), Gas(100)],
+        build_time = 20, produced_by = nydus_network)
 hydralisk = GameUnit(UnitNames.hydralisk, [hydralisk_den],
-        costs = [Mineral(100), Gas(50), Supply(2)])
+        costs = [Mineral(100), Gas(50), Supply(2)],
+        build_time = 33, larva = True)
 corrupter = GameUnit(UnitNames.corrupter, [spire],
-        costs = [Mineral(150), Gas(100), Supply(2)])
+        costs = [Mineral(150), Gas(100), Supply(2)],
+        build_time = 40, larva = True)
 mutalisk = GameUnit(UnitNames.mutalisk, [spire],
-        costs = [Mineral(100), Gas(100), Supply(2)])
+        costs = [Mineral(100), Gas(100), Supply(2)],
+        build_time = 33, larva = True)
 infestor = GameUnit(UnitNames.infestor, [infestation_pit],
-        costs = [Mineral(100), Gas(150), Supply(2)])
+        costs = [Mineral(100), Gas(150), Supply(2)],
+        build_time = 50, larva = True)
 roach = GameUnit(UnitNames.roach, [roach_warren],
-        costs = [Mineral(75), Gas(25), Supply(2)])
+        costs = [Mineral(75), Gas(25), Supply(2)],
+        build_time = 27, larva = True)
 baneling = GameUnit(UnitNames.baneling, [baneling_nest],
         costs = [Mineral(25), Gas(25), Supply(.5)],
-        consumes = [zergling])
+        consumes = [zergling],
+        build_time = 20)
 brood_lord = GameUnit(UnitNames.brood_lord, [greater_spire],
         costs = [Mineral(150), Gas(150), Supply(4)],
-        consumes = [corrupter])
+        consumes = [corrupter],
+        build_time = 34)
 
 
 """
@@ -378,31 +448,44 @@ Protoss structures
 """
 
 nexus = GameUnit(UnitNames.nexus,
-        costs = [Mineral(400)])
+        costs = [Mineral(400)],
+        build_time = 100, provides = 10)
 pylon = GameUnit(UnitNames.pylon,
-        costs = [Mineral(100)])
+        costs = [Mineral(100)],
+        build_time = 25, provides = 8)
 assimilator = GameUnit(UnitNames.assimilator,
-        costs = [Mineral(75)])
+        costs = [Mineral(75)],
+        build_time = 30)
 gateway = GameUnit(UnitNames.gateway, [pylon],
-        costs = [Mineral(150)])
+        costs = [Mineral(150)],
+        build_time = 65)
 cybernetics_core = GameUnit(UnitNames.cybernetics_core, [gateway],
-        costs = [Mineral(150)])
+        costs = [Mineral(150)],
+        build_time = 50)
 forge = GameUnit(UnitNames.forge, [pylon],
-        costs = [Mineral(150)])
+        costs = [Mineral(150)],
+        build_time = 45)
 twilight_council = GameUnit(UnitNames.twilight_council, [cybernetics_core],
-        costs = [Mineral(150), Gas(100)])
+        costs = [Mineral(150), Gas(100)],
+        build_time = 50)
 templar_archives = GameUnit(UnitNames.templar_archives, [twilight_council],
-        costs = [Mineral(150), Gas(200)])
+        costs = [Mineral(150), Gas(200)],
+        build_time = 50)
 dark_shrine = GameUnit(UnitNames.dark_shrine, [twilight_council],
-        costs = [Mineral(100), Gas(250)])
+        costs = [Mineral(100), Gas(250)],
+        build_time = 100)
 stargate = GameUnit(UnitNames.stargate, [cybernetics_core],
-        costs = [Mineral(150), Gas(150)])
+        costs = [Mineral(150), Gas(150)],
+        build_time = 60)
 fleet_beacon = GameUnit(UnitNames.fleet_beacon, [stargate],
-        costs = [Mineral(300), Gas(200)])
+        costs = [Mineral(300), Gas(200)],
+        build_time = 60)
 robotics_facility = GameUnit(UnitNames.robotics_facility, [cybernetics_core],
-        costs = [Mineral(200), Gas(100)])
+        costs = [Mineral(200), Gas(100)],
+        build_time = 65)
 robotics_bay = GameUnit(UnitNames.robotics_bay, [robotics_facility],
-        costs = [Mineral(200), Gas(200)])
+        costs = [Mineral(200), Gas(200)],
+        build_time = 65)
 
 
 """
@@ -410,41 +493,57 @@ Protoss units
 """
 
 probe = GameUnit(UnitNames.probe,
-        costs = [Mineral(50), Supply(1)])
+        costs = [Mineral(50), Supply(1)],
+        build_time = 17, produced_by = nexus)
 zealot = GameUnit(UnitNames.zealot, [gateway],
-        costs = [Mineral(100), Supply(2)])
+        costs = [Mineral(100), Supply(2)],
+        build_time = 38, produced_by = gateway)
 sentry = GameUnit(UnitNames.sentry, [cybernetics_core],
-        costs = [Mineral(50), Gas(100), Supply(2)])
+        costs = [Mineral(50), Gas(100), Supply(2)],
+        build_time = 37, produced_by = gateway)
 stalker = GameUnit(UnitNames.stalker, [cybernetics_core],
-        costs = [Mineral(125), Gas(50), Supply(2)])
+        costs = [Mineral(125), Gas(50), Supply(2)],
+        build_time = 42, produced_by = gateway)
 photon_cannon = GameUnit(UnitNames.photon_cannon, [forge],
-        costs = [Mineral(150)])
+        costs = [Mineral(150)],
+        build_time = 40)
 dark_templar = GameUnit(UnitNames.dark_templar, [dark_shrine],
-        costs = [Mineral(125), Gas(125), Supply(2)])
+        costs = [Mineral(125), Gas(125), Supply(2)],
+        build_time = 55, produced_by = gateway)
 high_templar = GameUnit(UnitNames.high_templar, [templar_archives],
-        costs = [Mineral(50), Gas(150), Supply(2)])
+        costs = [Mineral(50), Gas(150), Supply(2)],
+        build_time = 55, produced_by = gateway)
 archon = GameUnit(UnitNames.archon,
         consumes = [
             [high_templar, high_templar],
             [high_templar, dark_templar],
             [dark_templar, dark_templar]],
-        costs = [Supply(4)])
+        costs = [Supply(4)],
+        build_time = 12)
 phoenix = GameUnit(UnitNames.phoenix, [stargate],
-        costs = [Mineral(150), Gas(100), Supply(2)])
+        costs = [Mineral(150), Gas(100), Supply(2)],
+        build_time = 35, produced_by = stargate)
 void_ray = GameUnit(UnitNames.void_ray, [stargate],
-        costs = [Mineral(250), Gas(150), Supply(3)])
+        costs = [Mineral(250), Gas(150), Supply(3)],
+        build_time = 60, produced_by = stargate)
 carrier = GameUnit(UnitNames.carrier, [fleet_beacon],
-        costs = [Mineral(350), Gas(250), Supply(6)])
+        costs = [Mineral(350), Gas(250), Supply(6)],
+        build_time = 120, produced_by = stargate)
 mothership = GameUnit(UnitNames.mothership, [fleet_beacon],
-        costs = [Mineral(400), Gas(400), Supply(8)])
+        costs = [Mineral(400), Gas(400), Supply(8)],
+        build_time = 160, produced_by = nexus)
 immortal = GameUnit(UnitNames.immortal, [robotics_facility],
-        costs = [Mineral(250), Gas(100), Supply(4)])
+        costs = [Mineral(250), Gas(100), Supply(4)],
+        build_time = 55, produced_by = robotics_facility)
 colossus = GameUnit(UnitNames.colossus, [robotics_bay],
-        costs = [Mineral(300), Gas(200), Supply(6)])
+        costs = [Mineral(300), Gas(200), Supply(6)],
+        build_time = 75, produced_by = robotics_facility)
 observer = GameUnit(UnitNames.observer, [robotics_facility],
-        costs = [Mineral(25), Gas(75), Supply(1)])
+        costs = [Mineral(25), Gas(75), Supply(1)],
+        build_time = 30, produced_by = robotics_facility)
 warp_prism = GameUnit(UnitNames.warp_prism, [robotics_facility],
-        costs = [Mineral(200), Supply(2)])
+        costs = [Mineral(200), Supply(2)],
+        build_time = 50, produced_by = robotics_facility)
 
 
 """
@@ -452,62 +551,85 @@ Terran Structures
 """
 
 command_center = GameUnit(UnitNames.command_center,
-        costs = [Mineral(400)])
+        costs = [Mineral(400)],
+        build_time = 100, provides = 11)
 supply_depot = GameUnit(UnitNames.supply_depot,
-        costs = [Mineral(100)])
+        costs = [Mineral(100)],
+        build_time = 30, provides = 8)
 refinery = GameUnit(UnitNames.refinery,
-        costs = [Mineral(75)])
+        costs = [Mineral(75)],
+        build_time = 30)
 barracks = GameUnit(UnitNames.barracks, [supply_depot],
-        costs = [Mineral(150)])
+        costs = [Mineral(150)],
+        build_time = 65)
 tech_lab = GameUnit(UnitNames.tech_lab, [innate],
-        costs = [Mineral(50), Gas(25)])
+        costs = [Mineral(50), Gas(25)],
+        build_time = 25)
 reactor = GameUnit(UnitNames.reactor, [innate],
-        costs = [Mineral(50), Gas(50)])
+        costs = [Mineral(50), Gas(50)],
+        build_time = 50)
 engineering_bay = GameUnit(UnitNames.engineering_bay, [command_center],
-        costs = [Mineral(125)])
+        costs = [Mineral(125)],
+        build_time = 35)
 missile_turret = GameUnit(UnitNames.missile_turret, [engineering_bay],
-        costs = [Mineral(100)])
+        costs = [Mineral(100)],
+        build_time = 25)
 planetary_fortress = GameUnit(UnitNames.planetary_fortress, [engineering_bay],
         costs = [Mineral(150), Gas(150)],
         consumes = [command_center],
-        acts_as = [command_center])
+        acts_as = [command_center],
+        build_time = 50)
 sentry_tower = GameUnit(UnitNames.sentry_tower, [engineering_bay],
-        costs = [Mineral(125), Gas(100)])
+        costs = [Mineral(125), Gas(100)],
+        build_time = 25)
 bunker = GameUnit(UnitNames.bunker, [barracks],
-        costs = [Mineral(150)])
+        costs = [Mineral(150)],
+        build_time = 35)
 factory = GameUnit(UnitNames.factory, [barracks],
-        costs = [Mineral(150), Gas(100)])
+        costs = [Mineral(150), Gas(100)],
+        build_time = 60)
 armory = GameUnit(UnitNames.armory, [factory],
-        costs = [Mineral(150), Gas(100)])
+        costs = [Mineral(150), Gas(100)],
+        build_time = 65)
 orbital_command = GameUnit(UnitNames.orbital_command, [barracks],
         costs = [Mineral(150)],
         consumes = [command_center],
-        acts_as = [command_center])
+        acts_as = [command_center],
+        build_time = 35)
 ghost_academy = GameUnit(UnitNames.ghost_academy, [barracks],
-        costs = [Mineral(150), Gas(50)])
+        costs = [Mineral(150), Gas(50)],
+        build_time = 40)
 starport = GameUnit(UnitNames.starport, [factory],
-        costs = [Mineral(150), Gas(100)])
+        costs = [Mineral(150), Gas(100)],
+        build_time = 50)
 fusion_core = GameUnit(UnitNames.fusion_core, [starport],
-        costs = [Mineral(150), Gas(100)])
+        costs = [Mineral(150), Gas(100)],
+        build_time = 65)
 
 tech_lab_barracks = GameUnit(UnitNames.tech_lab_barracks,
         consumes = [[tech_lab, barracks], barracks],
-        acts_as = [barracks])
+        acts_as = [barracks],
+        build_time = 25)
 reactor_barracks = GameUnit(UnitNames.reactor_barracks,
         consumes = [[reactor, barracks], barracks],
-        acts_as = [barracks])
+        acts_as = [barracks],
+        build_time = 50)
 tech_lab_factory = GameUnit(UnitNames.tech_lab_factory,
         consumes = [[tech_lab, factory], factory],
-        acts_as = [factory])
+        acts_as = [factory],
+        build_time = 25)
 reactor_factory = GameUnit(UnitNames.reactor_factory,
         consumes = [[reactor, factory], factory],
-        acts_as = [factory])
+        acts_as = [factory],
+        build_time = 50)
 tech_lab_starport = GameUnit(UnitNames.tech_lab_starport,
         consumes = [[tech_lab, starport], starport],
-        acts_as = [starport])
+        acts_as = [starport],
+        build_time = 25)
 reactor_starport = GameUnit(UnitNames.reactor_starport,
         consumes = [[reactor, starport], starport],
-        acts_as = [starport])
+        acts_as = [starport],
+        build_time = 50)
 
 detach_reactor_barracks = GameUnit(UnitNames.detach_reactor_barracks,
         consumes = [reactor_barracks],
@@ -534,33 +656,54 @@ Terran Units
 """
 
 scv = GameUnit(UnitNames.scv,
-        costs = [Mineral(50), Supply(1)])
+        costs = [Mineral(50), Supply(1)],
+        build_time = 17, produced_by = command_center)
 marine = GameUnit(UnitNames.marine, [barracks],
-        costs = [Mineral(50), Supply(1)])
+        costs = [Mineral(50), Supply(1)],
+        build_time = 25, produced_by = barracks)
 marauder = GameUnit(UnitNames.marauder, [tech_lab_barracks],
-        costs = [Mineral(100), Gas(25), Supply(2)])
+        costs = [Mineral(100), Gas(25), Supply(2)],
+        build_time = 30, produced_by = tech_lab_barracks)
 reaper = GameUnit(UnitNames.reaper, [tech_lab_barracks],
-        costs = [Mineral(50), Gas(50), Supply(1)])
+        costs = [Mineral(50), Gas(50), Supply(1)],
+        build_time = 45, produced_by = tech_lab_barracks)
 hellion = GameUnit(UnitNames.hellion, [factory],
-        costs = [Mineral(100), Supply(2)])
+        costs = [Mineral(100), Supply(2)],
+        build_time = 30, produced_by = factory)
 siege_tank = GameUnit(UnitNames.siege_tank, [tech_lab_factory],
-        costs = [Mineral(150), Gas(125), Supply(3)])
+        costs = [Mineral(150), Gas(125), Supply(3)],
+        build_time = 45, produced_by = tech_lab_factory)
 thor = GameUnit(UnitNames.thor, [tech_lab_factory, armory],
-        costs = [Mineral(300), Gas(200), Supply(6)])
+        costs = [Mineral(300), Gas(200), Supply(6)],
+        build_time = 60, produced_by = tech_lab_factory)
 ghost = GameUnit(UnitNames.ghost, [tech_lab_barracks, ghost_academy],
-        costs = [Mineral(200), Gas(100), Supply(2)])
+        costs = [Mineral(200), Gas(100), Supply(2)],
+        build_time = 40, produced_by = tech_lab_barracks)
 viking = GameUnit(UnitNames.viking, [starport],
-        costs = [Mineral(150), Gas(75), Supply(2)])
+        costs = [Mineral(150), Gas(75), Supply(2)],
+        build_time = 42, produced_by = starport)
 medivac = GameUnit(UnitNames.medivac, [starport],
-        costs = [Mineral(100), Gas(100), Supply(2)])
+        costs = [Mineral(100), Gas(100), Supply(2)],
+        build_time = 42, produced_by = starport)
 banshee = GameUnit(UnitNames.banshee, [tech_lab_starport],
-        costs = [Mineral(150), Gas(100), Supply(3)])
+        costs = [Mineral(150), Gas(100), Supply(3)],
+        build_time = 60, produced_by = tech_lab_starport)
 raven = GameUnit(UnitNames.raven, [tech_lab_starport],
-        costs = [Mineral(100), Gas(200), Supply(2)])
+        costs = [Mineral(100), Gas(200), Supply(2)],
+        build_time = 60, produced_by = tech_lab_starport)
 battlecruiser = GameUnit(UnitNames.battlecruiser,
         [tech_lab_starport, fusion_core],
-        costs = [Mineral(300), Gas(200), Supply(6)])
+        costs = [Mineral(300), Gas(200), Supply(6)],
+        build_time = 90, produced_by = tech_lab_starport)
+
 
+finalize_gameunits()
+
+# Changes whenever any unit definition does; part of derived cache keys.
+data_version = hashlib.sha1(''.join(repr((unit.name, unit.requirements,
+    unit.costs, unit.consumes, unit.acts_as, unit.yields, unit.build_time,
+    unit.provides, unit.produced_by, unit.larva))
+    for unit in gameunits_by_id)).hexdigest()
 
 zerg_units = [ drone, overlord, hatchery, extractor, spawning_pool,
         evolution_chamber, spore_crawler, spine_crawler, baneling_nest,
@@ -591,3 +734,9 @@ class Races:
     TERRAN = 'terran'
     PROTOSS = 'protoss'
     races = [ ZERG, TERRAN, PROTOSS ]
+
+race_units = {
+    Races.ZERG: zerg_units,
+    Races.TERRAN: terran_units,
+    Races.PROTOSS: protoss_units,
+}
@@ -0,0 +1,119 @@
+import sys, time, itertools, multiprocessing
+import sc_units, sc_orders
+from build_orders import db, models
+
+def summarize(build_id, race, unit_ids):
+    order = sc_orders.race_orders[race]()
+    valid = True
+    try:
+        for unit_id in unit_ids:
+            order.add_unit(sc_units.gameunits_by_id[unit_id])
+    except Exception:
+        valid = False
+    return dict(build_id = build_id,
+            **models.BuildSummary.values(order, valid, len(unit_ids)))
+
+def summarize_task(task):
+    return summarize(*task)
+
+def node_parents(connection):
+    return dict((node_id, (parent_id, unit_id)) for node_id, parent_id,
+            unit_id in connection.execute(
+                'SELECT id, parent_id, unit_id FROM node'))
+
+def trie_path(parents, node_id):
+    path = []
+    while node_id is not None:
+        node_id, unit_id = parents[node_id]
+        path.append(unit_id)
+    path.reverse()
+    return path
+
+def build_paths(parents, builds):
+    for build_id, race, trie_id in builds:
+        yield build_id, race, trie_path(parents, trie_id)
+
+def trie_summaries(connection):
+    children, builds = {}, {}
+    for node_id, parent_id, unit_id in connection.execute(
+            'SELECT id, parent_id, unit_id FROM node'):
+        children.setdefault(parent_id, []).append((node_id, unit_id))
+    for build_id, trie_id in connection.execute(
+            'SELECT id, trie_id FROM build'):
+        builds.setdefault(trie_id, []).append(build_id)
+    # Race only limits available_tech, which a summary never looks at.
+    stack = [(node_id, unit_id, 1, sc_orders.BuildOrder(()), True, ())
+            for node_id, unit_id in children.get(None, ())]
+    while stack:
+        node_id, unit_id, length, order, valid, features = stack.pop()
+        if valid:
+            try:
+                unit = sc_units.gameunits_by_id[unit_id]
+                supply = order.supply
+                order.add_unit(unit)
+                if length > 8 and unit.allows:
+                    features += ((unit, supply), )
+            except Exception:
+                valid = False
+        for build_id in builds.get(node_id, ()):
+            yield dict(build_id = build_id, **models.BuildSummary.values(
+                order, valid, length,
+                models.BuildSummary.encode_features(features)))
+        below = children.get(node_id, ())
+        for index, (child_id, child_unit_id) in enumerate(below):
+            stack.append((child_id, child_unit_id, length + 1,
+                index and valid and order.copy() or order, valid, features))
+
+def write_summaries(connection, summaries):
+    insert = models.BuildSummary.__table__.insert().prefix_with('OR REPLACE')
+    transaction = connection.begin()
+    try:
+        connection.execute(insert, summaries)
+        transaction.commit()
+    except:
+        transaction.rollback()
+        raise
+
+def report(done, total, invalid, started, out = sys.stderr):
+    elapsed = max(time.time() - started, 1e-6)
+    out.write('\r%d/%d builds  %d invalid  %.0f builds/s' % (done, total,
+        invalid, done / elapsed))
+    out.flush()
+
+def validate_all(processes = None, chunk_size = 500, trie = False):
+    # Fork before the engine is first used so workers never share one of
+    # its connections.
+    pool = not trie and multiprocessing.Pool(processes)
+    db.create_all()
+    connection = db.engine.connect()
+    try:
+        if trie:
+            total = connection.execute(
+                    'SELECT COUNT(*) FROM build').scalar()
+            results = trie_summaries(connection)
+        else:
+            parents = node_parents(connection)
+            builds = connection.execute('SELECT id, race, trie_id FROM '
+                    'build ORDER BY id').fetchall()
+            total = len(builds)
+            results = pool.imap_unordered(summarize_task,
+                    build_paths(parents, builds), chunk_size)
+        done = invalid = 0
+        started = time.time()
+        while True:
+            summaries = list(itertools.islice(results, chunk_size))
+            if not summaries:
+                break
+            write_summaries(connection, summaries)
+            done += len(summaries)
+            invalid += sum(1 for summary in summaries
+                    if not summary['valid'])
+            report(done, total, invalid, started)
+        if total:
+            sys.stderr.write('\n')
+        return done, invalid
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        connection.close()
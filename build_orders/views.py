@@ -1,10 +1,15 @@
 import functools, operator, datetime
-import flask, bcrypt
-import func_utils, decorators, sc_units, sc_orders
-from build_orders import app, models, forms, flask_decorators, permissions
+import flask
+import caches, func_utils, decorators, sc_units, sc_orders
+from build_orders import app, db, models, forms, flask_decorators, \
+        permissions, hashing, catalogue
 
 api_func = decorators.apply_f(decorators.obj_to_kwargs(flask.jsonify))
 
+build_pages = caches.LRUCache(4096,
+        max_size = app.config['BUILD_PAGE_CACHE_BYTES'],
+        sizeof = lambda page: len(page.encode('utf-8')))
+
 @app.route('/')
 def index():
     return flask.redirect(flask.url_for('builds'))
@@ -12,16 +17,99 @@ def index():
 def _unit_options(unit):
     return func_utils.map_sub(str, sc_units.all_gameunits[unit].data_obj)
 
+def _encoded_response(encoded):
+    if encoded is None:
+        flask.abort(404)
+    response = flask.Response(encoded.body, mimetype = 'application/json')
+    response.set_etag(encoded.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['CATALOGUE_MAX_AGE']
+    return response.make_conditional(flask.request)
+
 @app.route('/api/unit_options/<unit>')
-@api_func
-def api_unit_options(*args, **kwargs):
-    return _unit_options(*args, **kwargs)
+def api_unit_options(unit):
+    return _encoded_response(catalogue.unit_options.get(unit))
+
+@app.route('/api/units')
+def api_units():
+    return _encoded_response(
+            catalogue.race_units.get(flask.request.args.get('race')))
 
 @app.route('/unit_options/<unit>')
 def unit_options(*args, **kwargs):
     return flask.render_template('create.html',
             **_unit_options(*args, **kwargs))
 
+def _keyset_page(query, column):
+    size = app.config['BUILDS_PER_PAGE']
+    after = flask.request.args.get('after', 0, type = int)
+    rows = query.filter(column > after).order_by(column).limit(size + 1).all()
+    following = len(rows) > size and getattr(rows[size - 1], column.key)
+    return rows[:size], following
+
+@app.errorhandler(hashing.HashPoolFull)
+def hashing_busy(error):
+    return 'Too many logins in progress, try again shortly', 503,\
+            { 'Retry-After': '1' }
+
+@app.route('/api/metrics/hashing')
+@flask_decorators.login_required
+@flask_decorators.permission_required(permissions.Permissions.VIEW_METRICS)
+@api_func
+def api_hashing_metrics():
+    return hashing.pool().metrics()
+
+def _tree_names(tree):
+    return dict((str(unit), _tree_names(more))
+            for unit, more in tree.iteritems())
+
+def _build_order(build_id):
+    build = models.Build.query.options(db.joinedload(models.Build.trie))\
+            .filter_by(id = build_id).first()
+    if build is None:
+        flask.abort(404)
+    return build.order
+
+def _costs(order):
+    return dict((cost.__class__.__name__, cost.amount)
+            for cost in order.get_costs(sc_units.Mineral, sc_units.Gas))
+
+@app.route('/api/build/<int:build_id>/tech_tree')
+@api_func
+def api_tech_tree(build_id):
+    order = _build_order(build_id)
+    return {
+        'tech_tree': _tree_names(order.available_tech_tree),
+        'available': map(str, order.available_tech),
+        'supply': order.supply.amount,
+        'costs': _costs(order),
+    }
+
+@app.route('/api/build/<int:build_id>/tech_tree/<unit>')
+@api_func
+def api_tech_tree_delta(build_id, unit):
+    order = _build_order(build_id)
+    if unit not in sc_units.all_gameunits:
+        flask.abort(404)
+    unit = sc_units.all_gameunits[unit]
+    if not order.can_add(unit):
+        flask.abort(400)
+    after = order.copy().add_unit(unit)
+    before_tech, after_tech = order.available_tech, after.available_tech
+    before_costs, after_costs = _costs(order), _costs(after)
+    return {
+        'unit': str(unit),
+        'added': [str(more) for more in after_tech
+            if more not in before_tech],
+        'removed': [str(more) for more in before_tech
+            if more not in after_tech],
+        'supply': after.supply.amount,
+        'supply_change': after.supply.amount - order.supply.amount,
+        'cost_change': dict((name, after_costs.get(name, 0) -
+            before_costs.get(name, 0))
+            for name in set(before_costs) | set(after_costs)),
+    }
+
 @app.route('/user/register', methods = ['GET', 'POST'])
 def user_register():
     form = forms.RegistrationForm(flask.request.form)
@@ -39,6 +127,15 @@ def user_login():
     if flask.request.method == 'POST' and form.validate():
         user = models.User.query.filter_by(email = form.email.data).first()
         if user and user.check_password(form.password.data):
+            if user.needs_rehash:
+                # The login already succeeded; a busy pool only delays
+                # the rehash until the next one.
+                try:
+                    user.set_password(form.password.data)
+                    models.can_commit(user)
+                except hashing.HashPoolFull:
+                    pass
+            models.user_identities.set(user.username, user.identity)
             flask.session[models.User.SESSION_KEY] = user.username
             return flask.redirect(flask.url_for('index'))
         else:
@@ -51,15 +148,23 @@ def user_login():
 @app.route('/user/logout')
 @flask_decorators.login_required
 def user_logout():
-    flask.session.pop(models.User.SESSION_KEY, None)
+    models.user_identities.invalidate(
+            flask.session.pop(models.User.SESSION_KEY, None))
     return flask.redirect(flask.url_for('index'))
 
 @app.route('/user/builds')
 @flask_decorators.login_required
+@flask_decorators.max_queries(2)
 def user_builds():
-    builds = models.BuildDetails.query.filter_by(user = flask.g.user)
-    return flask.render_template('builds.html',
-            builds = map(operator.attrgetter('build'), builds))
+    details = models.BuildDetails.query.options(
+            db.joinedload_all('build.trie'),
+            db.joinedload_all('build.summary')).filter_by(
+                    user_id = flask.g.user.id)
+    details, following = _keyset_page(details, models.BuildDetails.id)
+    builds = map(operator.attrgetter('build'), details)
+    models.Build.preload_orders(builds)
+    return flask.render_template('builds.html', builds = builds,
+            following = following)
 
 @app.route('/build/create')
 @flask_decorators.login_required
@@ -69,12 +174,35 @@ def build_create():
 @app.route('/build/<int:build_id>')
 def build(build_id):
     build = models.Build.query.filter_by(id = build_id).first()
-    return flask.render_template('build.html', build = build)
+    if build is None:
+        flask.abort(404)
+    # The tech tree links embed the build id, so it is part of the key.
+    key = build.id, build.trie_id, sc_units.data_version
+    main = build_pages.get(key)
+    if main is None:
+        main = build_pages.set(key,
+                flask.render_template('build_main.html', build = build))
+    return flask.render_template('build.html', main = flask.Markup(main))
+
+def _top_builds(query):
+    scores = models.Vote.scores()
+    return query.join(models.BuildDetails).join(scores,
+            scores.c.build_details_id == models.BuildDetails.id).order_by(
+                    scores.c.score.desc(), models.Build.id).limit(
+                            app.config['BUILDS_PER_PAGE']).all(), False
 
 @app.route('/builds')
+@flask_decorators.max_queries(2)
 def builds():
-    builds = models.Build.query.all()
-    return flask.render_template('builds.html', builds = builds)
+    query = models.Build.query.options(db.joinedload(models.Build.trie),
+            db.joinedload(models.Build.summary))
+    if flask.request.args.get('sort') == 'top':
+        builds, following = _top_builds(query)
+    else:
+        builds, following = _keyset_page(query, models.Build.id)
+    models.Build.preload_orders(builds)
+    return flask.render_template('builds.html', builds = builds,
+            following = following)
 
 @app.route('/build/create/<race>')
 @flask_decorators.login_required
@@ -85,6 +213,8 @@ def build_create_race(race):
 @app.route('/build/add/<int:build_id>/<unit>')
 @flask_decorators.login_required
 def build_add(build_id, unit):
+    if unit not in sc_units.all_gameunits:
+        flask.abort(404)
     build = models.Build.query.filter_by(id = build_id).first()
     build.add_unit(unit)
     return flask.redirect(flask.url_for('build', build_id = build_id))
@@ -0,0 +1,57 @@
+import argparse, sys
+from build_orders import app, migrations, validation, importer
+
+def migrate(args):
+    migrations.migrate()
+
+def validate(args):
+    done, invalid = validation.validate_all(args.processes, args.chunk_size,
+            args.trie)
+    print '%d builds checked, %d invalid' % (done, invalid)
+
+def import_builds(args):
+    errors = args.errors and open(args.errors, 'w') or sys.stderr
+    try:
+        builds, nodes, rejected = importer.import_builds(args.files,
+                args.batch_size, errors)
+    finally:
+        if args.errors:
+            errors.close()
+    print '%d builds imported (%d new nodes), %d lines rejected' % (builds,
+            nodes, rejected)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Build orders maintenance')
+    parser.add_argument('--database',
+            help = 'Path of the SQLite database to operate on')
+    commands = parser.add_subparsers()
+    command = commands.add_parser('migrate',
+            help = 'Bring an existing database up to the current schema')
+    command.set_defaults(run = migrate)
+    command = commands.add_parser('validate',
+            help = 'Replay every stored build and rebuild its summary')
+    command.add_argument('--processes', type = int,
+            help = 'Worker processes, defaults to the number of cores')
+    command.add_argument('--chunk-size', type = int, default = 500,
+            help = 'Builds handed to a worker and written back at a time')
+    command.add_argument('--trie', action = 'store_true',
+            help = 'Walk the node trie once in this process, sharing '
+                'replay work across common prefixes')
+    command.set_defaults(run = validate)
+    command = commands.add_parser('import',
+            help = 'Import build orders from files, one per line, either '
+                '"race: Unit, Unit, ..." or {"race": ..., "units": [...]}')
+    command.add_argument('files', nargs = '+', type = argparse.FileType('r'),
+            help = 'Files to read, - for standard input')
+    command.add_argument('--batch-size', type = int, default = 1000,
+            help = 'Builds inserted per transaction')
+    command.add_argument('--errors',
+            help = 'Write rejected lines here instead of standard error')
+    command.set_defaults(run = import_builds)
+    args = parser.parse_args()
+    if args.database:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + args.database
+    args.run(args)
+
+if __name__ == '__main__':
+    main()